@@ -1,10 +1,20 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
-import os
 import datetime
+import hashlib
+import os
+import threading
+import time
 import pytz
 
+from engine import (DIV_FORMATS, DIV_TONES, MARKET_FORMATS, MARKET_TONES, RADAR_FORMATS, RADAR_TONES, METRICS,
+                    OPPORTUNITY_MARGIN, SCENARIO_SHOCKS, SCENARIO_YIELDS, STATIC_COLUMNS, STREAM_INTERVAL, BR_TTL,
+                    TABLE_PAGE_SIZE, HistoryStore, LogoCache, MarketRefresher, PriceStream, QuoteStore, ScenarioGrid,
+                    SearchIndex, SharedQuoteCache, SheetCache, SWRCache, apply_price_deltas, apply_prices,
+                    apply_scenario, apply_trends, connect_backend, dividend_view, find_spreadsheets, format_table,
+                    freshness_label, get_br_prices_stored, inc, ingest, scenario_inputs, search_rows,
+                    sources_signature, span, table_page)
+
 # ========== 1. CONFIGURAÇÃO ==========
 st.set_page_config(
     page_title="Dinheiro Data | Onyx",
@@ -170,6 +180,8 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ========== 3. LÓGICA DE DADOS ==========
+# A lógica vive no pacote engine (importável e testável sem Streamlit). Aqui ficam os recursos
+# compartilhados pelo processo (st.cache_resource) e a ligação com a interface.
 
 def get_time_greeting():
     tz = pytz.timezone('America/Sao_Paulo')
@@ -180,122 +192,183 @@ def get_time_greeting():
     elif 12 <= h < 18: greeting = "BOA TARDE"
     return greeting, now.strftime("%H:%M")
 
-def clean_currency(x):
-    if isinstance(x, (int, float)): return float(x)
-    if isinstance(x, str):
-        try: return float(x.replace('R$', '').replace('.', '').replace(',', '.').replace('%', '').strip())
-        except: return 0.0
-    return 0.0
-
-def clean_dy_percentage(x):
-    val = clean_currency(x)
-    return val * 100 if 0 < val < 1.0 else val
-
-def get_logo_url(ticker):
-    if not isinstance(ticker, str): return ""
-    clean = ticker.replace('.SA', '').strip().upper()
-    sites = {
-        'CXSE3': 'caixaseguradora.com.br', 'BBSE3': 'bbseguros.com.br', 'ODPV3': 'odontoprev.com.br',
-        'BBAS3': 'bb.com.br', 'ABCB4': 'abcbrasil.com.br', 'ITUB4': 'itau.com.br',
-        'ISAE4': 'isaenergiabrasil.com.br', 'TRPL4': 'isaenergiabrasil.com.br',
-        'CMIG4': 'cemig.com.br', 'SAPR4': 'sanepar.com.br', 'SAPR11': 'sanepar.com.br',
-        'PETR4': 'petrobras.com.br', 'RANI3': 'irani.com.br', 'KLBN11': 'klabin.com.br',
-        'KLBN4': 'klabin.com.br', 'IRBR3': 'ri.irbre.com', 'FLRY3': 'fleury.com.br',
-        'PSSA3': 'portoseguro.com.br', 'WEGE3': 'weg.net', 'VALE3': 'vale.com',
-        'ABEV3': 'ambev.com.br', 'B3SA3': 'b3.com.br', 'EGIE3': 'engie.com.br'
-    }
-    if clean in sites: return f"https://www.google.com/s2/favicons?domain={sites[clean]}&sz=128"
-    if clean in ['BTC','BITCOIN']: return "https://assets.coingecko.com/coins/images/1/small/bitcoin.png"
-    if clean in ['ETH','ETHEREUM']: return "https://assets.coingecko.com/coins/images/279/small/ethereum.png"
-    if clean in ['SOL','SOLANA']: return "https://assets.coingecko.com/coins/images/4128/small/solana.png"
-    return f"https://cdn.jsdelivr.net/gh/thefintz/icon-project@master/stock_logos/{clean}.png"
-
-@st.cache_data(ttl=60)
+@st.cache_resource
+def get_quote_store():
+    return QuoteStore()
+
+@st.cache_resource
+def get_logo_cache():
+    return LogoCache()
+
+@st.cache_resource
+def get_shared_cache():
+    # Réplicas atrás de um balanceador: DINHEIRO_CACHE_URL=redis://host:6379/0 (ou unix:///caminho.sock)
+    url = os.environ.get("DINHEIRO_CACHE_URL")
+    if not url: return None
+    try: return SharedQuoteCache(connect_backend(url))
+    except:
+        inc("stage_failures_total", stage="shared_cache")
+        return None
+
+@st.cache_resource
+def get_history_store():
+    return HistoryStore()
+
+@st.cache_resource
+def get_market_refresher():
+    return MarketRefresher(store=get_quote_store(), shared=get_shared_cache(), history=get_history_store()).start()
+
 def get_market_data():
-    groups = {
-        'USA': { 'S&P 500': '^GSPC', 'NASDAQ': '^IXIC', 'DOW JONES': '^DJI', 'VIX': '^VIX' },
-        'BRASIL': { 'IBOVESPA': '^BVSP', 'IFIX': 'IFIX.SA', 'VALE': 'VALE3.SA', 'PETROBRAS': 'PETR4.SA' },
-        'MOEDAS': { 'DÓLAR': 'BRL=X', 'EURO': 'EURBRL=X', 'LIBRA': 'GBPBRL=X', 'DXY': 'DX-Y.NYB' },
-        'COMMODITIES': { 'OURO': 'GC=F', 'PRATA': 'SI=F', 'COBRE': 'HG=F', 'PETRÓLEO': 'BZ=F' },
-        'CRIPTO': { 'BITCOIN': 'BTC-USD', 'ETHEREUM': 'ETH-USD', 'SOLANA': 'SOL-USD', 'BNB': 'BNB-USD' }
-    }
-    final_dfs = {}
-    for cat, items in groups.items():
-        rows = []
-        try:
-            tickers = list(items.values())
-            data = yf.download(tickers, period="5d", progress=False)['Close']
-            for name, ticker in items.items():
-                try:
-                    series = pd.Series()
-                    if len(tickers) > 1 and ticker in data.columns: series = data[ticker].dropna()
-                    elif isinstance(data, pd.Series): series = data.dropna()
-                    
-                    if len(series) >= 2:
-                        curr, prev = series.iloc[-1], series.iloc[-2]
-                        pct = ((curr - prev) / prev) * 100
-                        rows.append([name, curr, pct])
-                    else: rows.append([name, 0.0, 0.0])
-                except: rows.append([name, 0.0, 0.0])
-        except: pass
-        while len(rows) < 4: rows.append(["-", 0.0, 0.0])
-        final_dfs[cat] = pd.DataFrame(rows[:4], columns=["Ativo", "Preço", "Var%"])
-    return final_dfs
-
-@st.cache_data(ttl=300)
+    # (versão, frames): a versão muda a cada publicação do refresher e chaveia a formatação
+    with span("market.get"): return get_market_refresher().versioned()
+
+@st.cache_resource
+def get_br_fetch_metrics():
+    return {'last': []}
+
+@st.cache_resource
+def get_br_price_cache():
+    return SWRCache(ttl=BR_TTL, name="br_prices")
+
 def get_br_prices(ticker_list):
-    if not ticker_list: return {}
-    sa_tickers = [f"{t}.SA" for t in ticker_list]
-    try:
-        data = yf.download(sa_tickers, period="1d", progress=False)['Close'].iloc[-1]
-        if isinstance(data, float): return {ticker_list[0]: data}
-        prices = {}
-        for t in ticker_list:
-            if f"{t}.SA" in data: prices[t] = data[f"{t}.SA"]
+    # Recursos resolvidos aqui: o fetch pode rodar numa thread de fundo, fora do contexto do script
+    store, fetch_metrics, shared = get_quote_store(), get_br_fetch_metrics(), get_shared_cache()
+    def fetch():
+        # Sem fallback aqui: o SWRCache já guarda o último valor bom com o horário verdadeiro
+        prices, metrics = get_br_prices_stored(ticker_list, store, fallback=False, shared=shared)
+        fetch_metrics['last'] = metrics
         return prices
-    except: return {}
+    def seed():
+        stored = store.load(f"{t}.SA" for t in ticker_list)
+        return {t: (stored[f"{t}.SA"][0], stored[f"{t}.SA"][2]) for t in ticker_list if f"{t}.SA" in stored}
+    return get_br_price_cache().get(tuple(ticker_list), fetch, seed)
+
+def get_br_price_ages(ticker_list):
+    # Idade da última cotação boa de cada ticker (None se nunca teve), para o selo do Radar
+    ages = get_br_price_cache().ages(tuple(ticker_list))
+    return {t: ages.get(t) for t in ticker_list}
+
+@st.cache_resource
+def get_price_stream():
+    return PriceStream(store=get_quote_store())
+
+@st.cache_resource
+def get_sheet_cache():
+    return SheetCache(parse=ingest)
+
+def load_static():
+    # Estágio 1: planilhas mescladas por ticker (cacheadas até algum arquivo mudar, entrar ou sair)
+    paths = find_spreadsheets()
+    if not paths: return pd.DataFrame(columns=STATIC_COLUMNS)
+    return get_sheet_cache().get(tuple(paths))
+
+@st.cache_resource(max_entries=2)
+def get_search_index(version, _static):
+    return SearchIndex(_static.index, _static['Ativo'], _static['TICKER_F'])
+
+def load_search_index():
+    # Um índice por versão do conjunto de planilhas (caminho + mtime + tamanho de cada uma)
+    try:
+        paths = find_spreadsheets()
+        if not paths: return None
+        return get_search_index(sources_signature(paths), load_static())
+    except:
+        inc("stage_failures_total", stage="search_index")
+        return None
 
 def load_data():
+    """(radar, dividendos, versão). A versão junta o que define o conteúdo das tabelas (planilhas,
+    preços, histórico, logos) e chaveia o cache de formatação no lugar de hashear os frames."""
     df_radar, df_div = pd.DataFrame(), pd.DataFrame()
-    file_data = None
     try:
-        if os.path.exists("PEC.xlsx"): file_data = pd.ExcelFile("PEC.xlsx")
-        elif os.path.exists("PEC - Página1.csv"): file_data = pd.read_csv("PEC - Página1.csv")
-        
-        if file_data is not None:
-            target_df = pd.DataFrame()
-            if isinstance(file_data, pd.ExcelFile):
-                for sheet in file_data.sheet_names:
-                    temp = pd.read_excel(file_data, sheet)
-                    if any("BAZIN" in str(c).upper() for c in temp.columns):
-                        target_df = temp; break
-            else: target_df = file_data
-
-            if not target_df.empty:
-                target_df.columns = [str(c).strip().upper() for c in target_df.columns]
-                cols = target_df.columns
-                c_tick = next((c for c in cols if 'TICKER' in c), None)
-                c_baz = next((c for c in cols if 'BAZIN' in c), None)
-                c_dy = next((c for c in cols if 'DY' in c), None)
-                c_dpa = next((c for c in cols if 'DPA' in c), None)
-                c_emp = next((c for c in cols if 'EMPRESA' in c), None)
-
-                if c_tick and c_baz:
-                    target_df['TICKER_F'] = target_df[c_tick].astype(str).str.strip().str.upper()
-                    target_df['BAZIN_F'] = target_df[c_baz].apply(clean_currency)
-                    target_df['DY_F'] = target_df[c_dy].apply(clean_dy_percentage) if c_dy else 0.0
-                    target_df['DPA_F'] = target_df[c_dpa].apply(clean_currency) if c_dpa else 0.0
-                    
-                    prices = get_br_prices(target_df['TICKER_F'].unique().tolist())
-                    target_df['PRECO_F'] = target_df['TICKER_F'].map(prices).fillna(0)
-                    target_df['MARGEM_VAL'] = target_df.apply(lambda x: ((x['BAZIN_F'] - x['PRECO_F']) / x['PRECO_F'] * 100) if x['PRECO_F'] > 0 else -999, axis=1)
-                    target_df['Logo'] = target_df['TICKER_F'].apply(get_logo_url)
-                    target_df['Ativo'] = target_df[c_emp] if c_emp else target_df['TICKER_F']
-                    
-                    df_radar = target_df[target_df['BAZIN_F'] > 0][['Logo', 'Ativo', 'TICKER_F', 'BAZIN_F', 'PRECO_F', 'MARGEM_VAL']].sort_values('MARGEM_VAL', ascending=False)
-                    df_div = target_df[target_df['DY_F'] > 0][['Logo', 'Ativo', 'TICKER_F', 'DPA_F', 'DY_F']].sort_values('DY_F', ascending=False)
-    except: pass
-    return df_radar, df_div
+        with span("load.static"): static = load_static()
+        if static.empty: return df_radar, df_div, None
+        with span("load.prices"): prices = get_br_prices(static['TICKER_F'].unique().tolist())
+        version = (sources_signature(find_spreadsheets()), hash(tuple(sorted(prices.items()))))
+        with span("load.views"): df_radar, df_div = apply_prices(static, prices), dividend_view(static)
+    except:
+        inc("stage_failures_total", stage="load_data")
+        return pd.DataFrame(), pd.DataFrame(), None
+
+    # Enriquecimentos opcionais: se um falha, as tabelas saem sem ele (e a versão marca a falha)
+    try:
+        with span("load.trends"):
+            # Backfill/append do histórico em segundo plano; até lá as colunas ficam em '-'
+            history, symbols = get_history_store(), [f"{t}.SA" for t in static['TICKER_F'].unique()]
+            history.update_async(symbols)
+            trends_version = history.version
+            df_radar, version = apply_trends(df_radar, history.trends(symbols)), version + (trends_version,)
+    except:
+        inc("stage_failures_total", stage="load_trends")
+        version += ("no_trends",)
+
+    try:
+        with span("load.logos"):
+            logos = get_logo_cache()
+            logos.prefetch_async(static['TICKER_F'].unique())
+            logos_version = logos.version
+            radar_logos = logos.resolve(df_radar['TICKER_F'], df_radar['Logo'])
+            div_logos = logos.resolve(df_div['TICKER_F'], df_div['Logo'])
+            df_radar, df_div = df_radar.assign(Logo=radar_logos), df_div.assign(Logo=div_logos)
+            version += (logos_version,)
+    except:
+        inc("stage_failures_total", stage="load_logos")
+        version += ("no_logos",)
+    return df_radar, df_div, version
+
+@st.cache_resource(max_entries=4)
+def get_scenario_grid(key, _dpa, _preco):
+    return ScenarioGrid(_dpa, _preco)
+
+def load_scenario_grid(df_radar):
+    # Uma grade por combinação de DPA e preços; mover os sliders é só uma consulta na grade
+    dpa, preco = scenario_inputs(df_radar, load_static())
+    return get_scenario_grid(hashlib.sha1(dpa.tobytes() + preco.tobytes()).hexdigest(), dpa, preco)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def format_table_cached(version, formats, tones, _df):
+    # Chaveado pela versão explícita dos dados: o frame (_df) não é hasheado
+    return format_table(_df, formats, tones)
+
+def render_table(target, df, formats, tones, column_config, key=None, page_size=TABLE_PAGE_SIZE, version=None):
+    with span(f"render.{key or 'table'}"): _render_table(target, df, formats, tones, column_config, key, page_size, version)
+
+def _render_table(target, df, formats, tones, column_config, key, page_size, version):
+    # Só a página visível vira Styler e é serializada para o front; sem versão, formata sem cache
+    if version is None: text, css = format_table(df, formats, tones)
+    else: text, css = format_table_cached(version, formats, tones, df)
+    if key and len(text) > page_size:
+        pages = -(-len(text) // page_size)
+        page = target.number_input("Página", min_value=1, max_value=pages, value=1, key=f"{key}_page",
+                                   label_visibility="collapsed", help=f"{len(text)} ativos • {pages} páginas")
+        text, css = table_page(text, css, page, page_size)
+    styled = text.style
+    for col, values in css.items(): styled = styled.apply(lambda _, v=values: v, subset=[col])
+    target.dataframe(styled, column_config=column_config, hide_index=True, use_container_width=True)
+
+@st.cache_resource
+def start_metrics_exporter(path, interval=15):
+    # Opcional (DINHEIRO_METRICS_FILE): grava o texto Prometheus para o textfile collector
+    def loop():
+        while True:
+            try: METRICS.write_textfile(path)
+            except: inc("stage_failures_total", stage="metrics_export")
+            time.sleep(interval)
+    threading.Thread(target=loop, daemon=True, name="metrics-exporter").start()
+    return path
+
+def render_diagnostics():
+    # Painel escondido: ?diag=1 na URL
+    with st.expander("Diagnóstico", expanded=True):
+        c1, c2 = st.columns(2)
+        c1.download_button("metrics.json", METRICS.to_json(), file_name="metrics.json", mime="application/json")
+        c2.download_button("metrics.prom", METRICS.prometheus(), file_name="metrics.prom", mime="text/plain")
+        st.json(METRICS.snapshot(), expanded=False)
+        st.code(METRICS.prometheus(), language="text")
+        st.caption("Último fetch B3 (por lote) e planilha em cache")
+        st.json({'br_fetch': get_br_fetch_metrics()['last'], 'sheet_cache': get_sheet_cache().stats()}, expanded=False)
+
+if os.environ.get("DINHEIRO_METRICS_FILE"): start_metrics_exporter(os.environ["DINHEIRO_METRICS_FILE"])
 
 # ========== 4. INTERFACE ==========
 
@@ -327,72 +400,96 @@ with n3:
         <span class='card-icon'>💰</span><span class='card-title'>Dividendos</span><span class='card-desc'>Yield 2026</span>
     </a>""", unsafe_allow_html=True)
 
-M = get_market_data()
-df_radar, df_div = load_data()
+market_version, M = get_market_data()
+market_badge = freshness_label(get_market_refresher().ages())
+df_radar, df_div, data_version = load_data()
+search_index = load_search_index()
 
 # --- PANORAMA ---
 st.markdown("<div id='panorama'></div>", unsafe_allow_html=True)
-st.markdown("""
+st.markdown(f"""
 <div class='section-box'>
     <div class='section-title'>Panorama Global</div>
-    <div class='section-badge'>LIVE DATA</div>
+    <div class='section-badge'>{market_badge}</div>
 </div>
 """, unsafe_allow_html=True)
 
-def render_market_table(col, title, df):
+TREND_CONFIG = {'1S%': st.column_config.TextColumn("1 Sem"), '1M%': st.column_config.TextColumn("1 Mês"),
+                'YTD%': st.column_config.TextColumn("No Ano"), 'Tendência': st.column_config.LineChartColumn("30 Dias")}
+
+def render_market_table(col, title, df, version):
     col.markdown(f"<div style='margin-bottom:12px; font-weight:700; color:#fff; letter-spacing:1px; font-size:0.85rem;'>{title}</div>", unsafe_allow_html=True)
     if not df.empty:
-        def color_var(val):
-            if val > 0: return 'color: #00ff9d; font-weight: 600;'
-            if val < 0: return 'color: #ff4d4d; font-weight: 600;'
-            return 'color: #666;'
-        def fmt_price(val): return "-" if val == 0 else f"{val:.2f}"
-        
-        styled = df.style.format({'Preço': fmt_price, 'Var%': '{:+.2f}%'}).map(color_var, subset=['Var%'])
-        col.dataframe(
-            styled,
-            column_config={'Ativo': st.column_config.TextColumn("Ativo"), 'Preço': st.column_config.TextColumn("Cotação"), 'Var%': st.column_config.TextColumn("Var %")},
-            hide_index=True, use_container_width=True
-        )
+        render_table(col, df, MARKET_FORMATS, MARKET_TONES,
+            {'Ativo': st.column_config.TextColumn("Ativo"), 'Preço': st.column_config.TextColumn("Cotação"), 'Var%': st.column_config.TextColumn("Var %"), **TREND_CONFIG},
+            version=(version, title))
 
 r1, r2, r3 = st.columns(3)
-render_market_table(r1, "🇺🇸 ÍNDICES EUA", M['USA'])
-render_market_table(r2, "🇧🇷 ÍNDICES BRASIL", M['BRASIL'])
-render_market_table(r3, "💱 MOEDAS", M['MOEDAS'])
+render_market_table(r1, "🇺🇸 ÍNDICES EUA", M['USA'], market_version)
+render_market_table(r2, "🇧🇷 ÍNDICES BRASIL", M['BRASIL'], market_version)
+render_market_table(r3, "💱 MOEDAS", M['MOEDAS'], market_version)
 st.write("") 
 r4, r5 = st.columns(2)
-render_market_table(r4, "🛢️ COMMODITIES", M['COMMODITIES'])
-render_market_table(r5, "💎 CRIPTOATIVOS", M['CRIPTO'])
+render_market_table(r4, "🛢️ COMMODITIES", M['COMMODITIES'], market_version)
+render_market_table(r5, "💎 CRIPTOATIVOS", M['CRIPTO'], market_version)
 
 # --- BAZIN ---
 st.markdown("<div id='radar-bazin'></div>", unsafe_allow_html=True)
-count_bazin = len(df_radar[df_radar['MARGEM_VAL'] > 10]) if not df_radar.empty else 0
 
-st.markdown(f"""
-<div class='section-box'>
-    <div class='section-title'>Radar Bazin</div>
-    <div class='section-badge'>{count_bazin} OPORTUNIDADES (>10%)</div>
-</div>
-<div class='section-desc-text'>
-    O Preço Teto é calculado utilizando a metodologia de Décio Bazin (adaptado à nossa visão), visando identificar ativos que pagam bons dividendos a preços descontados.
-</div>
-""", unsafe_allow_html=True)
+@st.fragment(run_every=STREAM_INTERVAL)
+def render_radar(base, search_index, base_version):
+    # Reexecuta só esta seção a cada tick do stream, aplicando os deltas às linhas que mudaram
+    df_radar, version = base, 0
+    if not base.empty:
+        stream = get_price_stream().track(base['TICKER_F'].tolist())
+        live = st.session_state.get('radar_live')
+        if live is None or live[0] is not base: live = (base, 0, base)
+        version, deltas = stream.deltas_since(live[1])
+        df_radar = apply_price_deltas(live[2], deltas) if deltas else live[2]
+        st.session_state['radar_live'] = (base, version, df_radar)
+    view = None
+
+    header, scenario = st.empty(), ""
+    if not df_radar.empty:
+        with st.expander("🧪 Cenários: yield alvo × choque de preço"):
+            grid = load_scenario_grid(df_radar)
+            c1, c2, c3 = st.columns([2, 2, 1])
+            target = c1.select_slider("Yield alvo (teto = DPA / yield)", options=SCENARIO_YIELDS, value=6.0,
+                                      format_func=lambda v: f"{v:.1f}%", key="sc_yield")
+            shock = c2.select_slider("Choque no preço", options=SCENARIO_SHOCKS, value=0,
+                                     format_func=lambda v: f"{v:+d}%", key="sc_shock")
+            applied = c3.toggle("Aplicar ao radar", key="sc_apply")
+            st.caption(f"{grid.count(target, shock)} oportunidades (>{OPPORTUNITY_MARGIN}%) neste cenário • "
+                       "contagem por cenário (linhas: yield alvo, colunas: choque)")
+            st.dataframe(grid.counts_frame(), use_container_width=True)
+        if applied:
+            df_radar = apply_scenario(df_radar, grid, target, shock)
+            scenario = f" • CENÁRIO {target:.1f}% / {shock:+d}%"
+            view = (target, shock)
+
+    count_bazin = len(df_radar[df_radar['MARGEM_VAL'] > OPPORTUNITY_MARGIN]) if not df_radar.empty else 0
+    static = load_static()
+    prices_badge = freshness_label(get_br_price_ages(static['TICKER_F'].unique().tolist())) if not static.empty else ""
+
+    header.markdown(f"""
+    <div class='section-box'>
+        <div class='section-title'>Radar Bazin</div>
+        <div class='section-badge'>{count_bazin} OPORTUNIDADES (>10%){scenario}{' • ' + prices_badge if prices_badge else ''}</div>
+    </div>
+    <div class='section-desc-text'>
+        O Preço Teto é calculado utilizando a metodologia de Décio Bazin (adaptado à nossa visão), visando identificar ativos que pagam bons dividendos a preços descontados.
+    </div>
+    """, unsafe_allow_html=True)
 
-if not df_radar.empty:
-    search1 = st.text_input("", placeholder="🔍 Ex: BB Seguridade...", key="s1")
-    data_show = df_radar.copy()
-    if search1: data_show = data_show[data_show['Ativo'].str.contains(search1, case=False) | data_show['TICKER_F'].str.contains(search1, case=False)]
+    if not df_radar.empty:
+        search1 = st.text_input("", placeholder="🔍 Ex: BB Seguridade...", key="s1")
+        data_show = search_rows(df_radar, search_index, search1)
 
-    def style_bazin(v):
-        if v > 10: return 'color: #00ff9d; font-weight: 700;'
-        if v < 0: return 'color: #ff4d4d; font-weight: 700;'
-        return 'color: #666;'
+        render_table(st, data_show, RADAR_FORMATS, RADAR_TONES,
+            {"Logo": st.column_config.ImageColumn(""), "Ativo": st.column_config.TextColumn("Ativo"), "TICKER_F": None, "BAZIN_F": st.column_config.TextColumn("Preço Teto"), "PRECO_F": st.column_config.TextColumn("Cotação"), "MARGEM_VAL": st.column_config.TextColumn("Margem"), **TREND_CONFIG},
+            key="radar", version=None if base_version is None else (base_version, version, view, search1))
 
-    st.dataframe(
-        data_show.style.format({'BAZIN_F': 'R$ {:.2f}', 'PRECO_F': 'R$ {:.2f}', 'MARGEM_VAL': '{:+.1f}%'}).map(style_bazin, subset=['MARGEM_VAL']),
-        column_config={"Logo": st.column_config.ImageColumn(""), "Ativo": st.column_config.TextColumn("Ativo"), "TICKER_F": None, "BAZIN_F": st.column_config.TextColumn("Preço Teto"), "PRECO_F": st.column_config.TextColumn("Cotação"), "MARGEM_VAL": st.column_config.TextColumn("Margem")},
-        hide_index=True, use_container_width=True
-    )
+render_radar(df_radar, search_index, data_version)
 
 # --- DIVIDENDOS ---
 st.markdown("<div id='dividendos'></div>", unsafe_allow_html=True)
@@ -410,16 +507,13 @@ st.markdown(f"""
 
 if not df_div.empty:
     search2 = st.text_input("", placeholder="🔍 Ex: BB Seguridade...", key="s2")
-    div_show = df_div.copy()
-    if search2: div_show = div_show[div_show['Ativo'].str.contains(search2, case=False) | div_show['TICKER_F'].str.contains(search2, case=False)]
+    div_show = search_rows(df_div, search_index, search2)
 
-    def style_dy(v): return 'color: #00ff9d; font-weight: 700;' if v > 8 else 'color: #666;'
+    render_table(st, div_show, DIV_FORMATS, DIV_TONES,
+        {"Logo": st.column_config.ImageColumn(""), "Ativo": st.column_config.TextColumn("Ativo"), "TICKER_F": None, "DPA_F": st.column_config.TextColumn("Div. / Ação"), "DY_F": st.column_config.TextColumn("Yield Projetado")},
+        key="div", version=None if data_version is None else (data_version, search2))
 
-    st.dataframe(
-        div_show.style.format({'DPA_F': 'R$ {:.2f}', 'DY_F': '{:.2f}%'}).map(style_dy, subset=['DY_F']),
-        column_config={"Logo": st.column_config.ImageColumn(""), "Ativo": st.column_config.TextColumn("Ativo"), "TICKER_F": None, "DPA_F": st.column_config.TextColumn("Div. / Ação"), "DY_F": st.column_config.TextColumn("Yield Projetado")},
-        hide_index=True, use_container_width=True
-    )
+if st.query_params.get("diag") == "1": render_diagnostics()
 
 # --- FOOTER ---
 st.markdown("""
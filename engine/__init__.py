@@ -0,0 +1,22 @@
+"""Camada de dados do Dinheiro Data, importável sem Streamlit.
+
+O app (app.py) só adiciona os recursos por processo (st.cache_resource) e a interface;
+`python -m engine` expõe o mesmo pipeline na linha de comando.
+"""
+from .cache import (CACHE_DIR, QUOTE_DB, MemoryBackend, QuoteStore, RedisBackend, SharedQuoteCache, SWRCache,
+                    connect_backend)
+from .history import HISTORY_DIR, TREND_COLUMNS, HistoryStore, fetch_daily_closes, trend_frame
+from .ingest import SPREADSHEET_DIR, find_spreadsheets, ingest, merge_sources, scan_headers, sources_signature
+from .logos import LogoCache
+from .metrics import METRICS, Metrics, inc, span
+from .pipeline import run_pipeline, yahoo_prices
+from .quotes import (BR_TTL, MARKET_GROUPS, MARKET_TICKERS, STREAM_INTERVAL, MarketRefresher, PriceStream,
+                     fetch_br_prices, fetch_market_data, get_br_prices_stored, yf_download)
+from .render import (DIV_FORMATS, DIV_TONES, MARKET_FORMATS, MARKET_TONES, RADAR_FORMATS, RADAR_TONES,
+                     TABLE_PAGE_SIZE, format_table, freshness_label, table_page)
+from .scenarios import (OPPORTUNITY_MARGIN, SCENARIO_SHOCKS, SCENARIO_YIELDS, ScenarioGrid, apply_scenario,
+                        scenario_inputs, scenario_margins)
+from .search import SearchIndex, search_rows
+from .sheet import (STATIC_COLUMNS, SheetCache, apply_price_deltas, apply_prices, apply_trends, clean_currency,
+                    clean_currency_series, dividend_view, file_signature, find_spreadsheet, get_logo_url,
+                    parse_spreadsheet)
@@ -0,0 +1,192 @@
+"""Benchmark de cada estágio do pipeline sobre planilhas sintéticas e fontes falsas."""
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from .fakes import FakeDownloader, FakePriceProvider, write_synthetic_workbook
+from .history import HistoryStore, fetch_daily_closes
+from .ingest import INGEST_WORKERS, ingest, scan_headers
+from .quotes import MARKET_GROUPS, fetch_br_prices, fetch_market_quotes, serialize
+from .render import RADAR_FORMATS, RADAR_TONES, format_table, table_page
+from .scenarios import ScenarioGrid
+from .search import SearchIndex, search_rows
+from .sheet import (SheetCache, apply_price_deltas, apply_prices, clean_currency, clean_currency_series,
+                    margin_values, parse_spreadsheet, read_fundamentals)
+
+def timed(fn, repeat=3):
+    # Melhor de `repeat` execuções: (segundos, resultado da última)
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def peak_memory(fn):
+    # Pico de alocações Python (tracemalloc) de uma execução; processos filhos não entram na conta
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally: tracemalloc.stop()
+
+def styler_payload(df):
+    # Caminho antigo: Styler com format/map por célula sobre o frame inteiro
+    def style(v):
+        if v > 10: return 'color: #00ff9d; font-weight: 700;'
+        if v < 0: return 'color: #ff4d4d; font-weight: 700;'
+        return 'color: #666;'
+    return len(df.style.format({'BAZIN_F': 'R$ {:.2f}', 'PRECO_F': 'R$ {:.2f}', 'MARGEM_VAL': '{:+.1f}%'}).map(style, subset=['MARGEM_VAL']).to_html())
+
+def paged_payload(df):
+    text, css = table_page(*format_table(df, RADAR_FORMATS, RADAR_TONES), page=1)
+    styled = text.style
+    for col, values in css.items(): styled = styled.apply(lambda _, v=values: v, subset=[col])
+    return len(styled.to_html())
+
+def bench_rows(rows, workdir, repeat=3, latency=0.02, per_symbol=0.001):
+    out = []
+    def add(stage, seconds, **extra): out.append({'stage': stage, 'rows': rows, 'ms': seconds * 1000, **extra})
+
+    path = write_synthetic_workbook(os.path.join(workdir, f"bench_{rows}.xlsx"), rows)
+    raw = pd.read_excel(path, sheet_name="Fundamentos")
+
+    t, static = timed(lambda: parse_spreadsheet(path), repeat)
+    add("sheet.parse_xlsx", t)
+    cache_dir = os.path.join(workdir, f"cache_{rows}")
+    t, _ = timed(lambda: SheetCache(cache_dir=cache_dir).get(path), 1)
+    add("sheet.cache_cold", t)
+    t, _ = timed(lambda: SheetCache(cache_dir=cache_dir).get(path), repeat)
+    add("sheet.cache_sidecar", t)
+    warm = SheetCache(cache_dir=cache_dir)
+    warm.get(path)
+    t, _ = timed(lambda: warm.get(path), repeat)
+    add("sheet.cache_hit", t, **warm.stats())
+
+    col = raw['PREÇO TETO BAZIN']
+    t_old, old = timed(lambda: col.apply(clean_currency), repeat)
+    t_new, new = timed(lambda: clean_currency_series(col), repeat)
+    same = bool(np.allclose(old.astype(float), new, equal_nan=True))
+    add("clean.apply", t_old)
+    add("clean.vectorized", t_new, equal=same)
+
+    provider = FakePriceProvider()
+    prices = provider(static['TICKER_F'].unique().tolist())
+    frame = static.assign(PRECO_F=static['TICKER_F'].map(prices).fillna(0))
+    t, _ = timed(lambda: frame.apply(lambda x: ((x['BAZIN_F'] - x['PRECO_F']) / x['PRECO_F'] * 100) if x['PRECO_F'] > 0 else -999, axis=1), repeat)
+    add("margin.rowwise", t)
+    t, _ = timed(lambda: margin_values(frame['BAZIN_F'], frame['PRECO_F']), repeat)
+    add("margin.vectorized", t)
+
+    t, radar = timed(lambda: apply_prices(parse_spreadsheet(path), provider(static['TICKER_F'].unique().tolist())), 1)
+    add("reload.full", t)
+    t, _ = timed(lambda: apply_prices(static, prices), repeat)
+    add("reload.price_join", t)
+    tick = dict(list(prices.items())[:max(1, rows // 100)])
+    t, _ = timed(lambda: apply_price_deltas(radar, tick), repeat)
+    add("reload.price_deltas", t, changed=len(tick))
+
+    tickers = static['TICKER_F'].unique().tolist()
+    # Serializados como o yf_download em produção: os lotes não se sobrepõem, então o ganho medido
+    # aqui é o de isolar falhas e retentativas, não o de paralelismo
+    slow = FakeDownloader(latency=latency, per_symbol=per_symbol)
+    t, _ = timed(lambda: fetch_br_prices(tickers, downloader=serialize(slow), chunk_size=len(tickers), max_workers=1), 1)
+    add("prices.single_call", t, calls=slow.calls)
+    chunked = FakeDownloader(latency=latency, per_symbol=per_symbol, fail={f"{tickers[0]}.SA"})
+    t, (found, metrics) = timed(lambda: fetch_br_prices(tickers, downloader=serialize(chunked), retries=0), 1)
+    add("prices.chunked", t, calls=chunked.calls, chunks=len(metrics), found=len(found), failed_chunks=sum(m['error'] is not None for m in metrics))
+
+    # Histórico: backfill de 1 ano uma vez, depois só o último dia; retornos vetorizados sobre os arrays
+    daily, bars = FakeDownloader(latency=latency, bars=250), []
+    def fetch_daily(symbols, start_day):
+        found = fetch_daily_closes(symbols, start_day, daily)
+        bars.append(sum(len(a) for a in found.values()))
+        return found
+    history = HistoryStore(os.path.join(workdir, f"history_{rows}"), fetch=fetch_daily, ttl=0)
+    symbols = [f"{t}.SA" for t in tickers]
+    t, _ = timed(lambda: history.update(symbols), 1)
+    add("history.backfill", t, calls=daily.calls, bars=sum(bars))
+    calls, bars[:] = daily.calls, []
+    t, _ = timed(lambda: history.update(symbols), 1)
+    add("history.append", t, calls=daily.calls - calls, bars=sum(bars))
+    t, _ = timed(lambda: history.trends(symbols), 1)
+    add("history.trends", t)
+
+    t, index = timed(lambda: SearchIndex(static.index, static['Ativo'], static['TICKER_F']), 1)
+    add("search.index_build", t)
+    for query in ("sao", "energ"):
+        t, _ = timed(lambda: static[static['Ativo'].str.contains(query, case=False) | static['TICKER_F'].str.contains(query, case=False)], repeat)
+        add(f"search.str_contains[{query}]", t)
+        t, _ = timed(lambda: search_rows(static, index, query), repeat)
+        add(f"search.index[{query}]", t)
+
+    t, size = timed(lambda: styler_payload(radar), 1)
+    add("render.styler_full", t, bytes=size)
+    t, size = timed(lambda: paged_payload(radar), 1)
+    add("render.vectorized_page", t, bytes=size)
+    return out
+
+def bench_ingest(rows, workdir, repeat=3, workbooks=4):
+    # Planilhas grandes com uma aba decoy do mesmo tamanho antes da de fundamentos
+    out = []
+    def add(stage, seconds, **extra): out.append({'stage': stage, 'rows': rows, 'ms': seconds * 1000, **extra})
+    paths = [write_synthetic_workbook(os.path.join(workdir, f"ingest_{rows}_{i}.xlsx"), rows, seed=i, decoy_rows=rows)
+             for i in range(workbooks)]
+    path = paths[0]
+
+    t, _ = timed(lambda: read_fundamentals(path), 1)
+    add("ingest.read_excel_scan", t, peak_kb=peak_memory(lambda: read_fundamentals(path)) // 1024)
+    t, _ = timed(lambda: scan_headers(path), repeat)
+    add("ingest.header_scan", t, peak_kb=peak_memory(lambda: scan_headers(path)) // 1024)
+    t, _ = timed(lambda: parse_spreadsheet(path), 1)
+    add("ingest.parse_pandas", t, peak_kb=peak_memory(lambda: parse_spreadsheet(path)) // 1024)
+    t, _ = timed(lambda: ingest(path, workers=1), 1)
+    add("ingest.parse_streaming", t, peak_kb=peak_memory(lambda: ingest(path, workers=1)) // 1024)
+
+    t, serial = timed(lambda: ingest(paths, workers=1), 1)
+    add(f"ingest.serial[{workbooks}]", t, tickers=len(serial))
+    t, parallel = timed(lambda: ingest(paths, workers=INGEST_WORKERS, min_bytes=0), 1)
+    add(f"ingest.parallel[{workbooks}]", t, tickers=len(parallel), cpus=os.cpu_count(), same=serial.equals(parallel))
+    return out
+
+def bench_scenarios(tickers=1_000, yields=10, shocks=10, repeat=3, seed=0):
+    # Grade de cenários: um pandas recompute por cenário (antigo) contra um broadcast NumPy único
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({'DPA_F': rng.uniform(0, 8, tickers), 'PRECO_F': rng.uniform(5, 100, tickers)})
+    ys, ss = np.linspace(4, 12, yields), np.linspace(-30, 30, shocks)
+    scenarios = len(ys) * len(ss)
+    row = {'rows': tickers, 'scenarios': scenarios}
+    def pandas_loop():
+        counts = []
+        for y in ys:
+            for s in ss:
+                preco = frame['PRECO_F'] * (1 + s / 100)
+                counts.append(int((margin_values(frame['DPA_F'] / (y / 100), preco) > 10).sum()))
+        return counts
+    t_old, old = timed(pandas_loop, repeat)
+    t_new, grid = timed(lambda: ScenarioGrid(frame['DPA_F'], frame['PRECO_F'], ys, ss), repeat)
+    keys = [(y, s) for y in ys for s in ss]
+    t_hit, _ = timed(lambda: [(grid.count(y, s), grid.margin(y, s)) for y, s in keys], repeat)
+    same = old == [grid.count(y, s) for y, s in keys]
+    return [{'stage': "scenarios.pandas_loop", 'ms': t_old * 1000, **row},
+            {'stage': "scenarios.grid", 'ms': t_new * 1000, 'same': same, **row},
+            {'stage': "scenarios.lookup", 'ms': t_hit * 1000, 'us_per_scenario': round(t_hit / scenarios * 1e6, 2), **row}]
+
+def bench_market(repeat=3, latency=0.02, per_symbol=0.001):
+    # Panorama: um download por grupo (antigo) contra um único download em lote
+    per_group = FakeDownloader(latency=latency, per_symbol=per_symbol)
+    t_old, _ = timed(lambda: [per_group(list(items.values()), period="5d") for items in MARKET_GROUPS.values()], repeat)
+    batched = FakeDownloader(latency=latency, per_symbol=per_symbol)
+    t_new, _ = timed(lambda: fetch_market_quotes(batched), repeat)
+    return [{'stage': "market.per_group", 'rows': 20, 'ms': t_old * 1000, 'calls': per_group.calls // repeat},
+            {'stage': "market.batched", 'rows': 20, 'ms': t_new * 1000, 'calls': batched.calls // repeat}]
+
+def run_bench(rows=(1_000, 10_000), repeat=3, latency=0.02, per_symbol=0.001, workdir=None, workbooks=4):
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        results = bench_market(repeat, latency, per_symbol) + bench_scenarios(repeat=repeat)
+        for n in rows: results += bench_rows(n, tmp, repeat, latency, per_symbol) + bench_ingest(n, tmp, repeat, workbooks)
+    return results
@@ -0,0 +1,276 @@
+"""Persistência e caches de cotações compartilhados entre sessões e processos."""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+
+from .metrics import inc, span
+
+CACHE_DIR = ".cache"
+QUOTE_DB = os.path.join(CACHE_DIR, "quotes.sqlite")
+
+class QuoteStore:
+    """Última cotação conhecida por símbolo (fechamento, fechamento anterior, horário) em SQLite.
+    O modo WAL deixa vários processos do mesmo host lerem e gravarem o arquivo com segurança."""
+    def __init__(self, path=QUOTE_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("CREATE TABLE IF NOT EXISTS quotes (symbol TEXT PRIMARY KEY, close REAL, prev_close REAL, updated_at REAL)")
+
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        con.execute("PRAGMA busy_timeout=30000")
+        return con
+
+    def upsert(self, quotes, ts=None):
+        # quotes: {símbolo: (fechamento, fechamento anterior ou None)}
+        if not quotes: return
+        ts = time.time() if ts is None else ts
+        rows = [(s, float(c), None if p is None else float(p), ts) for s, (c, p) in quotes.items()]
+        with closing(self._connect()) as con, con:
+            con.executemany(
+                "INSERT INTO quotes VALUES (?, ?, ?, ?) ON CONFLICT(symbol) DO UPDATE SET "
+                "close = excluded.close, prev_close = COALESCE(excluded.prev_close, quotes.prev_close), "
+                "updated_at = excluded.updated_at", rows)
+
+    def load(self, symbols=None):
+        # {símbolo: (fechamento, fechamento anterior, updated_at)}
+        with closing(self._connect()) as con:
+            if symbols is None: cur = con.execute("SELECT symbol, close, prev_close, updated_at FROM quotes")
+            else:
+                symbols = list(symbols)
+                if not symbols: return {}
+                marks = ",".join("?" * len(symbols))
+                cur = con.execute(f"SELECT symbol, close, prev_close, updated_at FROM quotes WHERE symbol IN ({marks})", symbols)
+            return {s: (c, p, ts) for s, c, p, ts in cur.fetchall()}
+
+class SWRCache:
+    """Stale-while-revalidate por chave: serve o último valor bom na hora, dispara no máximo um
+    refresh por chave (sem thundering herd quando várias sessões expiram juntas) e, se o refresh
+    falha, mantém os valores anteriores. Valores são dicts {símbolo: valor}; cada símbolo guarda
+    o horário da última cotação boa. clock/spawn são injetáveis (relógio e threads falsos)."""
+    def __init__(self, ttl, clock=time.time, spawn=None, name="swr"):
+        self.ttl, self.clock, self.name = ttl, clock, name
+        self.spawn = spawn or (lambda fn: threading.Thread(target=fn, daemon=True).start())
+        self.refreshes = self.failures = 0
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _store(self, key, values, stamps, checked_at, error=None):
+        entry = self._entries.setdefault(key, {'values': {}, 'stamps': {}, 'checked_at': checked_at, 'error': None})
+        entry['values'].update(values)
+        entry['stamps'].update(stamps)
+        entry['checked_at'], entry['error'] = checked_at, error
+
+    def _refresh(self, key, fetch, done):
+        now = self.clock()
+        try:
+            with span(f"refresh.{self.name}"): values = fetch()
+            with self._lock:
+                self.refreshes += 1
+                self._store(key, values, {s: now for s in values}, now)
+        except Exception as e:
+            inc("refresh_failures_total", cache=self.name)
+            with self._lock:
+                self.failures += 1
+                # Próxima tentativa só depois do TTL, para não martelar a fonte durante uma queda
+                self._store(key, {}, {}, now, repr(e))
+        finally:
+            with self._lock: self._inflight.pop(key, None)
+            done.set()
+
+    def get(self, key, fetch, seed=None):
+        """seed(): valores antigos {símbolo: (valor, horário)} para servir enquanto o primeiro refresh roda."""
+        with self._lock: entry = self._entries.get(key)
+        if entry is None and seed is not None:
+            # Seed faz I/O (SQLite): fora do lock, para uma chave fria não travar as outras
+            try: seeded = seed()
+            except:
+                inc("stage_failures_total", stage="swr_seed", cache=self.name)
+                seeded = {}
+            if seeded:
+                with self._lock:
+                    if key not in self._entries:
+                        self._store(key, {s: v for s, (v, _) in seeded.items()}, {s: t for s, (_, t) in seeded.items()}, float('-inf'))
+        with self._lock:
+            entry = self._entries.get(key)
+            stale = entry is None or self.clock() - entry['checked_at'] >= self.ttl
+            done = self._inflight.get(key)
+            start = stale and done is None
+            if start: done = self._inflight[key] = threading.Event()
+        inc("cache_requests_total", cache=self.name, result="miss" if entry is None else "stale" if stale else "fresh")
+        if start:
+            if entry is None: self._refresh(key, fetch, done)
+            else: self.spawn(lambda: self._refresh(key, fetch, done))
+        if entry is None:
+            # Nada para servir ainda: espera o refresh em andamento (só no primeiro acesso)
+            done.wait()
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry['values']) if entry else {}
+
+    def ages(self, key):
+        # Segundos desde a última cotação boa de cada símbolo
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            return {s: now - t for s, t in entry['stamps'].items()} if entry else {}
+
+class MemoryBackend:
+    """Backend em processo com a mesma interface do RedisBackend: substituto nos testes e em
+    deploys de uma réplica só (DINHEIRO_CACHE_URL=memory://)."""
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item and item[1] <= self.clock():
+            del self._data[key]
+            return None
+        return item
+
+    def get_many(self, keys):
+        with self._lock: items = [self._live(k) for k in keys]
+        return [item[0] if item else None for item in items]
+
+    def set_many(self, mapping, ttl):
+        expires = self.clock() + ttl
+        with self._lock: self._data.update({k: (v, expires) for k, v in mapping.items()})
+
+    def acquire(self, key, token, ttl):
+        with self._lock:
+            if self._live(key): return False
+            self._data[key] = (token, self.clock() + ttl)
+            return True
+
+    def release(self, key, token):
+        with self._lock:
+            item = self._live(key)
+            if item and item[0] == token: del self._data[key]
+
+    def locked(self, key):
+        with self._lock: return self._live(key) is not None
+
+class RedisBackend:
+    """Qualquer servidor do protocolo Redis (redis, valkey, keydb), por TCP ou socket Unix
+    (redis://host:6379/0, unix:///run/redis.sock). client é um redis.Redis ou um fakeredis.FakeRedis;
+    o pacote redis só é necessário quando este backend é usado."""
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url, socket_timeout=5, socket_connect_timeout=2))
+
+    def get_many(self, keys):
+        return self.client.mget(keys) if keys else []
+
+    def set_many(self, mapping, ttl):
+        with self.client.pipeline(transaction=False) as pipe:
+            for k, v in mapping.items(): pipe.set(k, v, px=int(ttl * 1000))
+            pipe.execute()
+
+    def acquire(self, key, token, ttl):
+        return bool(self.client.set(key, token, nx=True, px=int(ttl * 1000)))
+
+    def release(self, key, token):
+        # Compare-and-delete com WATCH: não apaga o lock que já expirou e foi pego por outra réplica
+        import redis
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = pipe.get(key)
+                if current is not None and current.decode() == token:
+                    pipe.multi()
+                    pipe.delete(key)
+                    pipe.execute()
+            except redis.WatchError: pass
+
+    def locked(self, key):
+        return bool(self.client.exists(key))
+
+def connect_backend(url):
+    if url.startswith("memory://"): return MemoryBackend()
+    return RedisBackend.from_url(url)
+
+class SharedQuoteCache:
+    """Cotações compartilhadas entre réplicas: uma chave por símbolo ({valor, horário}) e um lock
+    distribuído por tipo (market, br). Só a réplica que pega o lock vai ao Yahoo; as outras
+    esperam o lock sair, leem o que ela gravou e buscam (uma de cada vez) o que ela não trouxe.
+    Se o backend cair, cada réplica busca sozinha."""
+    def __init__(self, backend, namespace="dinheiro", lock_ttl=30, keep=86400, poll=0.1, clock=time.time):
+        self.backend, self.namespace = backend, namespace
+        self.lock_ttl, self.keep, self.poll, self.clock = lock_ttl, keep, poll, clock
+        self.fetches = self.waits = 0
+
+    def _key(self, *parts):
+        return ":".join((self.namespace,) + parts)
+
+    def load(self, kind, symbols):
+        # {símbolo: (valor, horário)}; listas do JSON voltam como tuplas (fechamento, anterior)
+        raw = self.backend.get_many([self._key("q", kind, s) for s in symbols])
+        out = {}
+        for s, item in zip(symbols, raw):
+            if item is None: continue
+            value, at = json.loads(item)
+            out[s] = (tuple(value) if isinstance(value, list) else value, at)
+        return out
+
+    def publish(self, kind, values, at):
+        if values: self.backend.set_many({self._key("q", kind, s): json.dumps([v, at]) for s, v in values.items()}, self.keep)
+
+    def _split(self, kind, symbols, max_age):
+        cached = self.load(kind, symbols)
+        now = self.clock()
+        return cached, [s for s in symbols if s not in cached or now - cached[s][1] >= max_age]
+
+    def refresh(self, kind, symbols, fetch, max_age, budget=None):
+        """fetch(símbolos) -> {símbolo: valor}. Devolve {símbolo: (valor, horário)} com tudo o que o
+        backend tiver, inclusive valores mais velhos que max_age (o chamador decide o fallback).
+        budget: pior caso do fetch em segundos; vira o TTL do lock (padrão: lock_ttl)."""
+        symbols = list(symbols)
+        try: cached, missing = self._split(kind, symbols, max_age)
+        except:
+            inc("shared_cache_errors_total", kind=kind)
+            now = self.clock()
+            return {s: (v, now) for s, v in fetch(symbols).items()}
+        inc("cache_requests_total", len(symbols) - len(missing), cache=f"shared_{kind}", result="hit")
+        if not missing: return cached
+        inc("cache_requests_total", len(missing), cache=f"shared_{kind}", result="miss")
+
+        ttl = max(self.lock_ttl, budget or 0)
+        lock, token, deadline = self._key("lock", kind), uuid.uuid4().hex, self.clock() + ttl
+        while not self.backend.acquire(lock, token, ttl):
+            # Outra réplica está buscando, talvez outros símbolos: espera o lock sair e relê; o que
+            # ela não trouxe é buscado aqui (pegando o lock), ou sem lock se o prazo acabar
+            self.waits += 1
+            with span(f"shared.wait.{kind}"):
+                while self.backend.locked(lock) and self.clock() < deadline: time.sleep(self.poll)
+            cached, missing = self._split(kind, symbols, max_age)
+            if not missing: return cached
+            if self.clock() >= deadline:
+                inc("shared_lock_timeouts_total", kind=kind)
+                return self._fetch(kind, missing, fetch, cached)
+        try:
+            # Relê com o lock na mão: a réplica anterior pode ter terminado entre a leitura e o lock
+            cached, missing = self._split(kind, symbols, max_age)
+            if missing: self._fetch(kind, missing, fetch, cached)
+        finally: self.backend.release(lock, token)
+        return cached
+
+    def _fetch(self, kind, missing, fetch, cached):
+        self.fetches += 1
+        fetched = fetch(missing)
+        at = self.clock()
+        self.publish(kind, fetched, at)
+        cached.update({s: (v, at) for s, v in fetched.items()})
+        return cached
@@ -0,0 +1,68 @@
+"""Linha de comando: `python -m engine run` roda o pipeline e `python -m engine bench` mede cada estágio."""
+import argparse
+import json
+import os
+import sys
+
+from .bench import run_bench
+from .fakes import FakePriceProvider
+from .metrics import METRICS
+from .pipeline import run_pipeline, yahoo_prices
+
+def cmd_run(args):
+    try: _run(args)
+    finally:
+        if args.metrics == "json": sys.stderr.write(METRICS.to_json() + "\n")
+        elif args.metrics == "prometheus": sys.stderr.write(METRICS.prometheus())
+
+def _run(args):
+    provider = FakePriceProvider(seed=args.seed) if args.provider == "fake" else yahoo_prices
+    result = run_pipeline(args.sheet, provider)
+    if args.format == "parquet":
+        if not args.out: raise SystemExit("--out é obrigatório com --format parquet")
+        os.makedirs(args.out, exist_ok=True)
+        result['radar'].to_parquet(os.path.join(args.out, "radar.parquet"))
+        result['dividends'].to_parquet(os.path.join(args.out, "dividendos.parquet"))
+        return
+    payload = '{"radar": %s, "dividendos": %s}' % (result['radar'].to_json(orient="records", force_ascii=False),
+                                                   result['dividends'].to_json(orient="records", force_ascii=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f: f.write(payload)
+    else: sys.stdout.write(payload + "\n")
+
+def cmd_bench(args):
+    results = run_bench(args.rows, args.repeat, args.latency, args.per_symbol, workbooks=args.workbooks)
+    if args.json:
+        sys.stdout.write(json.dumps(results, indent=2) + "\n")
+        return
+    for r in results:
+        extra = " ".join(f"{k}={v}" for k, v in r.items() if k not in ("stage", "rows", "ms"))
+        print(f"{r['stage']:<28} {r['rows']:>8} {r['ms']:>11.2f} ms  {extra}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m engine", description="Pipeline do Dinheiro Data sem Streamlit.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="lê a planilha, busca preços e emite radar e dividendos")
+    run.add_argument("--sheet", nargs="+", help="planilhas em ordem de precedência (padrão: PEC.xlsx ou PEC - Página1.csv e planilhas/*)")
+    run.add_argument("--provider", choices=("yahoo", "fake"), default="yahoo")
+    run.add_argument("--seed", type=int, default=0, help="semente do provedor fake")
+    run.add_argument("--format", choices=("json", "parquet"), default="json")
+    run.add_argument("--out", help="arquivo JSON ou diretório Parquet (padrão JSON: stdout)")
+    run.add_argument("--metrics", choices=("json", "prometheus"), help="emite tempos por estágio e contadores no stderr")
+    run.set_defaults(func=cmd_run)
+
+    bench = sub.add_parser("bench", help="mede cada estágio em planilhas sintéticas com provedores falsos")
+    bench.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000])
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.add_argument("--latency", type=float, default=0.02, help="latência simulada por chamada ao provedor (s)")
+    bench.add_argument("--per-symbol", type=float, default=0.001, help="latência simulada adicional por símbolo (s)")
+    bench.add_argument("--workbooks", type=int, default=4, help="planilhas geradas para o estágio de ingestão paralela")
+    bench.add_argument("--json", action="store_true")
+    bench.set_defaults(func=cmd_bench)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Fontes falsas e planilhas sintéticas para benchmarks e testes sem rede."""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+class FakeDownloader:
+    """Substituto do yf.download: devolve um frame no mesmo formato (colunas ('Close', símbolo)),
+    com latência injetada (fixa + por símbolo), símbolos que fazem a chamada inteira falhar e
+    símbolos que voltam como coluna NaN (como o yfinance faz com ticker ruim). Conta chamadas e tempos."""
+    def __init__(self, latency=0.0, per_symbol=0.0, fail=(), missing=(), bars=5, seed=0):
+        self.latency, self.per_symbol, self.fail, self.bars = latency, per_symbol, set(fail), bars
+        self.missing = set(missing)
+        self.calls, self.durations = 0, []
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, tickers, **kwargs):
+        start = time.perf_counter()
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        with self._lock: self.calls += 1
+        delay = self.latency + self.per_symbol * len(tickers)
+        if delay: time.sleep(delay)
+        try:
+            bad = [t for t in tickers if t in self.fail]
+            if bad: raise RuntimeError(f"falha simulada: {', '.join(bad)}")
+            if kwargs.get('interval') == '1d':
+                # Barras diárias em dias úteis: a partir de start (append) ou as últimas self.bars (backfill)
+                end = pd.Timestamp.now().normalize()
+                index = pd.bdate_range(start=kwargs['start'], end=end) if 'start' in kwargs else pd.bdate_range(end=end, periods=self.bars)
+            else: index = pd.date_range(end=pd.Timestamp.now(tz='UTC').floor('min'), periods=self.bars, freq='1min')
+            with self._lock: values = self._rng.uniform(5, 100, (len(index), len(tickers)))
+            values[:, [i for i, t in enumerate(tickers) if t in self.missing]] = np.nan
+            return pd.concat({'Close': pd.DataFrame(values, index=index, columns=tickers)}, axis=1)
+        finally:
+            with self._lock: self.durations.append(time.perf_counter() - start)
+
+class FakePriceProvider:
+    """Provedor de preços para o pipeline: {ticker: preço} determinístico por semente."""
+    def __init__(self, latency=0.0, seed=0):
+        self.latency, self.seed, self.calls = latency, seed, 0
+
+    def __call__(self, tickers):
+        self.calls += 1
+        if self.latency: time.sleep(self.latency)
+        rng = np.random.default_rng(self.seed + self.calls)
+        return dict(zip(tickers, rng.uniform(5, 100, len(tickers)).round(2)))
+
+def synthetic_sheet(rows, seed=0):
+    # Mesmo formato bagunçado das planilhas reais: moeda em texto "R$ 1.234,56", números soltos,
+    # DY ora fração (0,07) ora porcentagem ("7,5%"), nomes com acento
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    codes = [''.join(w) for w in letters[rng.integers(0, 26, (rows, 4))]]
+    tickers = [f"{c}{3 + i % 9}" for i, c in enumerate(codes)]
+    bazin = rng.uniform(2, 120, rows)
+    dy = rng.uniform(0, 0.15, rows)
+    dpa = rng.uniform(0, 8, rows)
+    as_text = rng.random(rows) < 0.5
+    return pd.DataFrame({
+        'TICKER': tickers,
+        'EMPRESA': [f"Companhia Energética {c.title()} {i}" if i % 3 else f"Ações São {c.title()} {i}" for i, c in enumerate(codes)],
+        'PREÇO TETO BAZIN': np.where(as_text, [f"R$ {v:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.') for v in bazin], bazin.round(2).astype(object)),
+        'DY 2026': np.where(as_text, [f"{v * 100:.1f}%".replace('.', ',') for v in dy], dy.round(4).astype(object)),
+        'DPA': dpa.round(2),
+    })
+
+def write_synthetic_workbook(path, rows, seed=0, decoy_rows=3):
+    # Uma aba sem BAZIN (de decoy_rows linhas) antes da de fundamentos, para exercitar a varredura de abas
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        decoy = pd.DataFrame({'NOTAS': ["resumo"] * decoy_rows, 'VALOR': np.arange(decoy_rows, dtype=float)})
+        decoy.to_excel(writer, sheet_name="Resumo", index=False)
+        synthetic_sheet(rows, seed).to_excel(writer, sheet_name="Fundamentos", index=False)
+    return path
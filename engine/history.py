@@ -0,0 +1,178 @@
+"""Histórico diário por símbolo em arrays NumPy no disco, com backfill único e append incremental.
+
+Cada símbolo vira um .npy estruturado (dia desde a época, fechamento) lido via mmap. O primeiro
+update baixa HISTORY_PERIOD de uma vez; os seguintes pedem só a partir do último dia guardado
+(que é regravado, porque o candle do dia muda até o fechamento).
+"""
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from .cache import CACHE_DIR
+from .metrics import inc, span
+from .quotes import BR_CHUNK_SIZE, BR_TIMEOUT, yf_download
+
+HISTORY_DIR = os.path.join(CACHE_DIR, "history")
+HISTORY_PERIOD = "2y"
+HISTORY_TTL = 900
+SPARK_POINTS = 30
+BAR_DTYPE = np.dtype([('day', '<i4'), ('close', '<f8')])
+# Horizontes em dias corridos; YTD é tratado à parte (último fechamento do ano anterior)
+HORIZONS = (('1S%', 7), ('1M%', 30))
+TREND_COLUMNS = ['1S%', '1M%', 'YTD%', 'Tendência']
+
+def fetch_daily_closes(symbols, start_day=None, downloader=yf_download):
+    # {símbolo: array BAR_DTYPE}; start_day (dias desde a época) pede só o trecho que falta
+    span_kw = {'start': str(np.datetime64(int(start_day), 'D'))} if start_day is not None else {'period': HISTORY_PERIOD}
+    data = downloader(list(symbols), interval="1d", progress=False, timeout=BR_TIMEOUT, **span_kw)['Close']
+    if isinstance(data, pd.Series): data = data.to_frame(symbols[0])
+    index = data.index.tz_localize(None) if getattr(data.index, 'tz', None) is not None else data.index
+    days = index.values.astype('datetime64[D]').astype(np.int32)
+    bars = {}
+    for sym in symbols:
+        if sym not in data.columns: continue
+        closes = data[sym].to_numpy(dtype=float)
+        ok = ~np.isnan(closes)
+        if not ok.any(): continue
+        out = np.empty(int(ok.sum()), BAR_DTYPE)
+        out['day'], out['close'] = days[ok], closes[ok]
+        bars[sym] = out
+    return bars
+
+def merge_bars(old, new):
+    # Barras novas substituem as antigas a partir do primeiro dia que trouxeram
+    if old is None or not len(old): return new
+    if not len(new): return old
+    return np.concatenate([old[old['day'] < new['day'][0]], new])
+
+class HistoryStore:
+    """Fechamentos diários por símbolo em .cache/history/<símbolo>.npy. update() só vai ao provedor
+    para símbolos sem histórico (backfill, uma chamada por lote) ou checados há mais de ttl
+    (a partir do último dia guardado); trends() calcula retornos e sparklines de uma vez."""
+    def __init__(self, root=HISTORY_DIR, fetch=fetch_daily_closes, ttl=HISTORY_TTL, chunk_size=BR_CHUNK_SIZE):
+        self.root, self.fetch, self.ttl, self.chunk_size = root, fetch, ttl, chunk_size
+        os.makedirs(root, exist_ok=True)
+        self.version = 0
+        self._series = {}
+        self._checked = {}
+        self._trends = None
+        self._lock = threading.Lock()
+        self._updating = threading.Lock()
+
+    def _path(self, sym):
+        return os.path.join(self.root, sym.replace("/", "_") + ".npy")
+
+    def bars(self, sym):
+        with self._lock:
+            if sym in self._series: return self._series[sym]
+        try:
+            arr = np.load(self._path(sym), mmap_mode='r')
+            # Arquivo de outro formato (gravado à mão, versão antiga) vira histórico vazio, refeito no backfill
+            if arr.dtype != BAR_DTYPE or arr.ndim != 1: raise ValueError(f"formato inesperado: {arr.dtype}")
+        except FileNotFoundError: arr = None
+        except:
+            inc("stage_failures_total", stage="history_read")
+            arr = None
+        with self._lock: self._series.setdefault(sym, arr)
+        return arr
+
+    def _save(self, sym, arr):
+        path = self._path(sym)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f: np.save(f, arr)
+        os.replace(tmp, path)
+
+    def _groups(self, symbols, now):
+        # Sem histórico: backfill; com histórico vencido: agrupa pelo último dia guardado
+        backfill, resume = [], {}
+        for sym in symbols:
+            if now - self._checked.get(sym, float('-inf')) < self.ttl: continue
+            arr = self.bars(sym)
+            if arr is None or not len(arr): backfill.append(sym)
+            else: resume.setdefault(int(arr['day'][-1]), []).append(sym)
+        groups = [(backfill[i:i + self.chunk_size], None) for i in range(0, len(backfill), self.chunk_size)]
+        for day, syms in sorted(resume.items()):
+            groups += [(syms[i:i + self.chunk_size], day) for i in range(0, len(syms), self.chunk_size)]
+        return groups
+
+    def update(self, symbols):
+        # Um update por vez: chamadas concorrentes (sessões, refresher) saem sem refazer o trabalho
+        if not self._updating.acquire(blocking=False): return 0
+        try:
+            now, changed = time.time(), 0
+            for chunk, start_day in self._groups(list(dict.fromkeys(symbols)), now):
+                with span("history.backfill" if start_day is None else "history.append"):
+                    try: fetched = self.fetch(chunk, start_day)
+                    except:
+                        for sym in chunk: inc("fetch_errors_total", source="history", symbol=sym)
+                        continue
+                for sym in chunk:
+                    self._checked[sym] = now
+                    if sym not in fetched: continue
+                    merged = merge_bars(self.bars(sym), fetched[sym])
+                    self._save(sym, merged)
+                    with self._lock: self._series[sym] = merged
+                    changed += 1
+            if changed:
+                with self._lock: self.version += 1
+            return changed
+        finally: self._updating.release()
+
+    def due(self, symbols):
+        # Algum símbolo sem checagem há mais de ttl (ou nunca checado)
+        now = time.time()
+        return any(now - self._checked.get(s, float('-inf')) >= self.ttl for s in symbols)
+
+    def update_async(self, symbols, done=None):
+        # done(alterados) roda na thread ao fim do update, para quem precisa republicar as tendências
+        if not self.due(symbols): return
+        def run():
+            try: changed = self.update(symbols)
+            except:
+                inc("stage_failures_total", stage="history_update")
+                return
+            if done is not None: done(changed)
+        threading.Thread(target=run, daemon=True, name="history").start()
+
+    def trends(self, symbols):
+        # Cacheado por versão do histórico: entre updates é só um lookup
+        symbols = tuple(symbols)
+        with self._lock: cached = self._trends
+        if cached and cached[0] == (self.version, symbols): return cached[1]
+        with span("history.trends"): frame = trend_frame(symbols, [self.bars(s) for s in symbols])
+        with self._lock: self._trends = ((self.version, symbols), frame)
+        return frame
+
+def trend_frame(symbols, series, points=SPARK_POINTS):
+    """Retornos 1S/1M/YTD e sparkline por símbolo, vetorizados sobre todos os arrays concatenados:
+    a chave (símbolo, dia) fica ordenada, então um searchsorted acha o fechamento de referência
+    de todos os símbolos de uma vez."""
+    lengths = np.array([0 if s is None else len(s) for s in series], dtype=np.int64)
+    frame = pd.DataFrame(np.nan, index=pd.Index(symbols), columns=TREND_COLUMNS[:-1])
+    frame['Tendência'] = None
+    if not lengths.any(): return frame
+    flat = np.concatenate([s for s in series if s is not None and len(s)])
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    has = lengths > 0
+    sym_idx = np.repeat(np.arange(len(symbols), dtype=np.int64), lengths)
+    stride = np.int64(1 << 32)
+    keys = sym_idx * stride + flat['day'].astype(np.int64)
+
+    last = np.where(has, ends - 1, 0)
+    last_day, last_close = flat['day'][last].astype(np.int64), flat['close'][last]
+    ids = np.arange(len(symbols), dtype=np.int64)
+    year_start = (last_day.astype('datetime64[D]').astype('datetime64[Y]').astype('datetime64[D]')).astype(np.int64)
+    targets = [(col, last_day - days) for col, days in HORIZONS] + [('YTD%', year_start - 1)]
+    for col, day in targets:
+        # Último fechamento em ou antes do dia alvo, dentro do próprio símbolo
+        ref = np.searchsorted(keys, ids * stride + day, side='right') - 1
+        ok = has & (ref >= starts)
+        ref_close = flat['close'][np.where(ok, ref, 0)]
+        frame[col] = np.where(ok & (ref_close > 0), (last_close / np.where(ref_close > 0, ref_close, 1) - 1) * 100, np.nan)
+    closes = flat['close']
+    frame['Tendência'] = [closes[max(s, e - points):e].tolist() if e > s else None for s, e in zip(starts, ends)]
+    return frame
@@ -0,0 +1,112 @@
+"""Ingestão de várias planilhas (a principal e as dos analistas) mescladas por ticker.
+
+Precedência: a planilha principal (PEC.xlsx, ou o CSV) vem antes das de SPREADSHEET_DIR, que
+entram em ordem alfabética; dentro de um arquivo, as abas seguem a ordem do workbook. Para cada
+ticker e cada campo (teto, DY, DPA, empresa) vale o primeiro valor preenchido nessa ordem, então
+uma planilha de analista completa o que falta na principal sem sobrescrever o que ela já tem.
+"""
+import glob
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import openpyxl
+import pandas as pd
+
+from .metrics import inc, span
+from .sheet import STATIC_COLUMNS, clean_fundamentals, dedupe_columns, file_signature, find_spreadsheet, map_logos
+
+SPREADSHEET_DIR = "planilhas"
+INGEST_WORKERS = 4
+# Abaixo disso o custo de subir processos (spawn reimporta pandas) passa o ganho do paralelismo
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+def find_spreadsheets(root=SPREADSHEET_DIR):
+    # Em ordem de precedência: principal primeiro, depois os arquivos dos analistas
+    main = find_spreadsheet()
+    extra = sorted(glob.glob(os.path.join(glob.escape(root), "*.xlsx")) + glob.glob(os.path.join(glob.escape(root), "*.csv")))
+    return ([main] if main else []) + [p for p in extra if not os.path.basename(p).startswith("~$")]
+
+def has_bazin(header):
+    return any("BAZIN" in str(c).upper() for c in header if c is not None)
+
+def scan_headers(path):
+    # Só a primeira linha de cada aba, em modo streaming: nenhuma aba é carregada para decidir
+    if not path.lower().endswith(".xlsx"):
+        return [None] if has_bazin(pd.read_csv(path, nrows=0).columns) else []
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try: return [ws.title for ws in wb.worksheets if has_bazin(next(ws.iter_rows(max_row=1, values_only=True), ()))]
+    finally: wb.close()
+
+def read_sheet(path, sheet=None):
+    # Linhas em streaming (read_only) direto para o DataFrame; sheet None é CSV
+    if sheet is None: return pd.read_csv(path)
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None: return pd.DataFrame()
+        columns = dedupe_columns([f"COL{i}" if c is None else c for i, c in enumerate(header)])
+        return pd.DataFrame(list(rows), columns=columns).dropna(how='all')
+    finally: wb.close()
+
+def scan_source(path):
+    # Arquivo ilegível (corrompido, travado, sumiu) não entra, e as outras planilhas seguem
+    try: return scan_headers(path)
+    except:
+        inc("stage_failures_total", stage="ingest_scan", source=os.path.basename(path))
+        return []
+
+def parse_source(task):
+    # Roda no processo filho: (caminho, aba) -> (fundamentos limpos, erro). A métrica do filho se
+    # perderia, então o erro volta para o processo principal contar; a fonte ruim vira frame vazio
+    path, sheet = task
+    try: return clean_fundamentals(read_sheet(path, sheet)), None
+    except Exception as e: return pd.DataFrame(columns=STATIC_COLUMNS), repr(e)
+
+def merge_sources(frames):
+    """Frames em ordem de precedência -> um por ticker, campo a campo o primeiro valor preenchido
+    (teto/DY/DPA > 0, empresa diferente do próprio ticker)."""
+    frames = [f for f in frames if not f.empty]
+    if not frames: return pd.DataFrame(columns=STATIC_COLUMNS)
+    allf = pd.concat(frames, ignore_index=True)
+    allf = allf[~allf['TICKER_F'].isin(["", "NAN", "NONE"])]
+    values = pd.DataFrame({
+        'TICKER_F': allf['TICKER_F'],
+        'BAZIN_F': allf['BAZIN_F'].where(allf['BAZIN_F'] > 0),
+        'DY_F': allf['DY_F'].where(allf['DY_F'] > 0),
+        'DPA_F': allf['DPA_F'].where(allf['DPA_F'] > 0),
+        'Ativo': allf['Ativo'].where(allf['Ativo'].astype(str) != allf['TICKER_F']),
+    })
+    # groupby.first pula NaN: em cada coluna fica o primeiro valor válido na ordem do concat
+    merged = values.groupby('TICKER_F', sort=False).first().reset_index()
+    merged[['BAZIN_F', 'DY_F', 'DPA_F']] = merged[['BAZIN_F', 'DY_F', 'DPA_F']].fillna(0.0)
+    merged['Ativo'] = merged['Ativo'].fillna(merged['TICKER_F'])
+    merged['Logo'] = map_logos(merged['TICKER_F'])
+    return merged[STATIC_COLUMNS]
+
+def ingest(paths, workers=INGEST_WORKERS, min_bytes=PARALLEL_MIN_BYTES):
+    """Varre os cabeçalhos, lê as abas com BAZIN (em paralelo num pool de processos quando há
+    mais de uma, mais de um núcleo e ao menos min_bytes de planilhas) e mescla por ticker.
+    Aceita um caminho ou uma lista em ordem de precedência. Uma fonte que falha é contada em
+    stage_failures_total e fica de fora; as demais são mescladas normalmente."""
+    paths = [paths] if isinstance(paths, str) else list(paths)
+    with span("ingest.scan"): tasks = [(p, sheet) for p in paths for sheet in scan_source(p)]
+    workers = min(workers, len(tasks), os.cpu_count() or 1)
+    with span("ingest.parse"):
+        results = None
+        if workers > 1 and sum(os.path.getsize(p) for p in dict.fromkeys(p for p, _ in tasks)) >= min_bytes:
+            # spawn: o processo do Streamlit tem threads, e fork com threads vivas não é seguro
+            try:
+                ctx = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                    results = list(pool.map(parse_source, tasks))
+            except: inc("stage_failures_total", stage="ingest_pool")
+        if results is None: results = [parse_source(t) for t in tasks]
+    for (path, _), (_, error) in zip(tasks, results):
+        if error is not None: inc("stage_failures_total", stage="ingest_parse", source=os.path.basename(path))
+    with span("ingest.merge"): return merge_sources([frame for frame, _ in results])
+
+def sources_signature(paths):
+    # Versão do conjunto de planilhas: muda quando qualquer arquivo muda, entra ou sai
+    return tuple(file_signature(p) for p in paths)
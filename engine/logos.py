@@ -0,0 +1,171 @@
+"""Logos dos ativos em cache local endereçado por conteúdo."""
+import os
+import io
+import json
+import base64
+import hashlib
+import threading
+import time
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from .cache import CACHE_DIR
+from .metrics import inc, span
+from .sheet import get_logo_url
+
+LOGO_DIR = os.path.join(CACHE_DIR, "logos")
+LOGO_SIZE = 40
+LOGO_NEGATIVE_TTL = 7 * 86400
+# Falha transitória (timeout, 403/429/5xx, sem rede): nova tentativa em 5 min, dobrando a cada
+# falha seguida até LOGO_NEGATIVE_TTL
+LOGO_RETRY_TTL = 300
+
+def fetch_logo_bytes(url, timeout=10):
+    # None = não existe logo (404); outras falhas sobem e o ticker é tentado de novo depois
+    req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp: return resp.read()
+    except urllib.error.HTTPError as e:
+        if e.code == 404: return None
+        raise
+
+def shrink_logo(raw, size=LOGO_SIZE):
+    with Image.open(io.BytesIO(raw)) as img:
+        img = img.convert('RGBA')
+        img.thumbnail((size, size))
+        out = io.BytesIO()
+        img.save(out, 'PNG', optimize=True)
+        return out.getvalue()
+
+class LogoCache:
+    """Logos baixados em lote, reduzidos e guardados por conteúdo (sha1.png) em LOGO_DIR.
+    index.json mapeia ticker -> hash, ou None quando o logo não existe (resultado negativo, revisto
+    após LOGO_NEGATIVE_TTL) ou quando a busca falhou (com o número de falhas seguidas, revisto com
+    backoff a partir de LOGO_RETRY_TTL). As imagens vão para a tabela como data URI, sem requests a CDNs."""
+    def __init__(self, root=LOGO_DIR, fetch=fetch_logo_bytes, size=LOGO_SIZE, negative_ttl=LOGO_NEGATIVE_TTL,
+                 max_workers=8, retry_ttl=LOGO_RETRY_TTL, clock=time.time):
+        self.root, self.fetch, self.size, self.clock = root, fetch, size, clock
+        self.negative_ttl, self.retry_ttl, self.max_workers = negative_ttl, retry_ttl, max_workers
+        os.makedirs(root, exist_ok=True)
+        self.index = self._load_index()
+        self._uris = {}
+        self._pending = set()
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def _index_path(self):
+        return os.path.join(self.root, "index.json")
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), encoding="utf-8") as f: return json.load(f)
+        except FileNotFoundError: return {}
+        except:
+            inc("stage_failures_total", stage="logo_index_read")
+            return {}
+
+    def _save_index(self):
+        # Junta com o que outros processos gravaram antes de substituir o arquivo
+        with self._lock:
+            merged = {**self._load_index(), **self.index}
+            if merged != self.index: self.version += 1
+            self.index = merged
+        tmp = f"{self._index_path()}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(merged, f)
+        os.replace(tmp, self._index_path())
+
+    def _put(self, ticker, raw, now):
+        data = shrink_logo(raw, self.size)
+        sha = hashlib.sha1(data).hexdigest()
+        path = os.path.join(self.root, f"{sha}.png")
+        if not os.path.exists(path):
+            with open(path, "wb") as f: f.write(data)
+        with self._lock:
+            self.index[ticker] = {'sha': sha, 'checked_at': now}
+            self.version += 1
+
+    def _miss(self, ticker, now):
+        with self._lock:
+            self.index[ticker] = {'sha': None, 'checked_at': now}
+            self.version += 1
+
+    def _failed(self, ticker, now):
+        with self._lock:
+            old = self.index.get(ticker) or {}
+            self.index[ticker] = {'sha': None, 'checked_at': now, 'failures': old.get('failures', 0) + 1}
+            self.version += 1
+
+    def seed(self, ticker, raw):
+        # Para testes offline e logos manuais: grava a imagem sem ir à rede
+        self._put(ticker, raw, self.clock())
+        self._save_index()
+
+    def _known(self, ticker, now):
+        entry = self.index.get(ticker)
+        if not entry: return False
+        if entry['sha'] is not None: return True
+        failures = entry.get('failures', 0)
+        ttl = min(self.retry_ttl * 2 ** (failures - 1), self.negative_ttl) if failures else self.negative_ttl
+        return now - entry['checked_at'] < ttl
+
+    def prefetch(self, tickers):
+        with span("logos.prefetch"): return self._prefetch(tickers)
+
+    def _prefetch(self, tickers):
+        now = self.clock()
+        with self._lock:
+            todo = [t for t in dict.fromkeys(tickers) if not self._known(t, now) and t not in self._pending]
+            self._pending.update(todo)
+        if not todo: return 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="logos") as pool:
+                futures = {t: pool.submit(self.fetch, get_logo_url(t)) for t in todo}
+            for t, fut in futures.items():
+                try: raw = fut.result()
+                except:
+                    inc("fetch_errors_total", source="logos", symbol=t)
+                    self._failed(t, now)
+                    continue
+                if raw is None: self._miss(t, now); continue
+                try: self._put(t, raw, now)
+                except:
+                    # Imagem que não decodifica conta como logo inexistente
+                    inc("stage_failures_total", stage="logo_decode")
+                    self._miss(t, now)
+            self._save_index()
+        finally:
+            with self._lock: self._pending.difference_update(todo)
+        return len(todo)
+
+    def prefetch_async(self, tickers):
+        now = self.clock()
+        tickers = list(tickers)
+        if all(self._known(t, now) or t in self._pending for t in tickers): return
+        threading.Thread(target=self.prefetch, args=(tickers,), name="logo-prefetch", daemon=True).start()
+
+    def data_uri(self, ticker):
+        entry = self.index.get(ticker)
+        if not entry or entry['sha'] is None: return None
+        sha = entry['sha']
+        if sha not in self._uris:
+            try:
+                with open(os.path.join(self.root, f"{sha}.png"), "rb") as f:
+                    self._uris[sha] = "data:image/png;base64," + base64.b64encode(f.read()).decode()
+            except:
+                inc("stage_failures_total", stage="logo_read")
+                return None
+        return self._uris[sha]
+
+    def resolve(self, tickers, fallback):
+        # Logo local quando já está no cache, vazio para negativos, URL remota só enquanto o lote não chegou
+        remote = dict(zip(tickers, fallback))
+        mapping = {}
+        for t in remote:
+            entry = self.index.get(t)
+            # Negativo (404) fica sem logo; falha transitória continua na URL remota até a próxima tentativa
+            if entry and entry['sha'] is None and not entry.get('failures'): mapping[t] = ""
+            else: mapping[t] = self.data_uri(t) or remote[t]
+        return tickers.map(mapping)
@@ -0,0 +1,103 @@
+"""Instrumentação do caminho quente: tempos por estágio, acertos de cache e erros de fetch.
+
+Desligada (DINHEIRO_METRICS=0), span() devolve um contexto nulo compartilhado e inc() retorna
+na primeira linha, então o custo fica em uma checagem de atributo por chamada.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+_NULL_SPAN = nullcontext()
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics, self.name = metrics, name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, error=exc_type is not None)
+        return False
+
+class Metrics:
+    """Registro em memória, por processo. Tempos viram count/sum/max/last por estágio; contadores
+    têm rótulos (cache/result, source/symbol). Exporta JSON e texto no formato do Prometheus."""
+    def __init__(self, enabled=True, prefix="dinheiro"):
+        self.enabled, self.prefix = enabled, prefix
+        self._timings = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        return _Span(self, name) if self.enabled else _NULL_SPAN
+
+    def observe(self, name, seconds, error=False):
+        if not self.enabled: return
+        with self._lock:
+            t = self._timings.setdefault(name, {'count': 0, 'sum': 0.0, 'max': 0.0, 'last': 0.0, 'errors': 0})
+            t['count'] += 1
+            t['sum'] += seconds
+            t['max'] = max(t['max'], seconds)
+            t['last'] = seconds
+            if error: t['errors'] += 1
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled: return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock: self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        with self._lock:
+            timings = {k: dict(v) for k, v in self._timings.items()}
+            counters = [{'name': n, 'labels': dict(l), 'value': v} for (n, l), v in self._counters.items()]
+        return {'enabled': self.enabled, 'timings': timings, 'counters': counters}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+
+    def prometheus(self):
+        snap, p = self.snapshot(), self.prefix
+        lines = [f"# TYPE {p}_stage_seconds summary"]
+        for stage, t in sorted(snap['timings'].items()):
+            lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {t["count"]}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {t["sum"]:.6f}')
+        lines.append(f"# TYPE {p}_stage_seconds_max gauge")
+        lines += [f'{p}_stage_seconds_max{{stage="{s}"}} {t["max"]:.6f}' for s, t in sorted(snap['timings'].items())]
+        lines.append(f"# TYPE {p}_stage_errors_total counter")
+        lines += [f'{p}_stage_errors_total{{stage="{s}"}} {t["errors"]}' for s, t in sorted(snap['timings'].items())]
+        names = sorted({c['name'] for c in snap['counters']})
+        for name in names:
+            lines.append(f"# TYPE {p}_{name} counter")
+            for c in snap['counters']:
+                if c['name'] != name: continue
+                labels = ",".join(f'{k}="{_escape(v)}"' for k, v in c['labels'].items())
+                lines.append(f"{p}_{name}{{{labels}}} {c['value']}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        # Para o textfile collector do node_exporter: grava atomicamente
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f: f.write(self.prometheus())
+        os.replace(tmp, path)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+METRICS = Metrics(enabled=os.environ.get("DINHEIRO_METRICS", "1") != "0")
+
+def span(name):
+    return METRICS.span(name)
+
+def inc(name, value=1, **labels):
+    if METRICS.enabled: METRICS.inc(name, value, **labels)
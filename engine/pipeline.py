@@ -0,0 +1,18 @@
+"""Pipeline completo sem Streamlit: planilha -> preços -> radar e dividendos."""
+from .metrics import span
+from .quotes import fetch_br_prices
+from .ingest import SPREADSHEET_DIR, find_spreadsheets, ingest
+from .sheet import SPREADSHEET_FILES, apply_prices, dividend_view
+
+def yahoo_prices(tickers):
+    return fetch_br_prices(tickers)[0]
+
+def run_pipeline(path=None, provider=yahoo_prices, sheet_cache=None):
+    """path: uma planilha ou várias em ordem de precedência (padrão: find_spreadsheets());
+    provider(tickers) -> {ticker: preço}; sheet_cache opcional (SheetCache) para reaproveitar a planilha."""
+    paths = [path] if isinstance(path, str) else list(path or find_spreadsheets())
+    if not paths: raise FileNotFoundError(f"nenhuma planilha encontrada ({', '.join(SPREADSHEET_FILES)} ou {SPREADSHEET_DIR}/)")
+    with span("load.static"): static = sheet_cache.get(tuple(paths)) if sheet_cache is not None else ingest(paths)
+    with span("load.prices"): prices = provider(static['TICKER_F'].unique().tolist()) if not static.empty else {}
+    with span("load.views"): radar, dividends = apply_prices(static, prices), dividend_view(static)
+    return {'static': static, 'prices': prices, 'radar': radar, 'dividends': dividends}
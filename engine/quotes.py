@@ -0,0 +1,407 @@
+"""Cotações: Panorama Global, preços da B3 em lotes e stream intradiário."""
+import datetime
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytz
+import yfinance as yf
+
+from .metrics import inc, span
+
+_YF_LOCK = threading.Lock()
+
+def yf_download(tickers, **kwargs):
+    # yf.download guarda estado em variáveis globais do módulo; chamadas simultâneas se atropelam.
+    # Cada chamada já paraleliza os tickers internamente (threads=True), então serializamos aqui.
+    with _YF_LOCK: return yf.download(tickers, **kwargs)
+
+# Downloaders serializados rodam um lote por vez, por mais threads que o fetch use: os prazos contam isso
+yf_download.serialized = True
+
+def serialize(downloader, lock=None):
+    # Mesmo contrato do yf_download para outro downloader (fakes do bench e dos testes)
+    lock = lock or threading.Lock()
+    def call(tickers, **kwargs):
+        with lock: return downloader(tickers, **kwargs)
+    call.serialized = True
+    return call
+
+MARKET_GROUPS = {
+    'USA': { 'S&P 500': '^GSPC', 'NASDAQ': '^IXIC', 'DOW JONES': '^DJI', 'VIX': '^VIX' },
+    'BRASIL': { 'IBOVESPA': '^BVSP', 'IFIX': 'IFIX.SA', 'VALE': 'VALE3.SA', 'PETROBRAS': 'PETR4.SA' },
+    'MOEDAS': { 'DÓLAR': 'BRL=X', 'EURO': 'EURBRL=X', 'LIBRA': 'GBPBRL=X', 'DXY': 'DX-Y.NYB' },
+    'COMMODITIES': { 'OURO': 'GC=F', 'PRATA': 'SI=F', 'COBRE': 'HG=F', 'PETRÓLEO': 'BZ=F' },
+    'CRIPTO': { 'BITCOIN': 'BTC-USD', 'ETHEREUM': 'ETH-USD', 'SOLANA': 'SOL-USD', 'BNB': 'BNB-USD' }
+}
+MARKET_TICKERS = [t for items in MARKET_GROUPS.values() for t in items.values()]
+
+def market_quotes(data):
+    # Do download único (colunas = tickers) para {símbolo: (atual, anterior)}
+    quotes = {}
+    for ticker in MARKET_TICKERS:
+        # Símbolo que falhar aqui fica de fora e é contado em fetch_market_quotes
+        try:
+            if not (isinstance(data, pd.DataFrame) and ticker in data.columns): continue
+            series = data[ticker].dropna()
+            if len(series) >= 2: quotes[ticker] = (float(series.iloc[-1]), float(series.iloc[-2]))
+        except: continue
+    return quotes
+
+def market_frames(quotes, trends=None):
+    # Monta as tabelas de cada categoria a partir das cotações (símbolo -> (atual, anterior, ...));
+    # trends (HistoryStore.trends, indexado por símbolo) acrescenta retornos e sparkline
+    final_dfs = {}
+    for cat, items in MARKET_GROUPS.items():
+        rows = []
+        for name, ticker in items.items():
+            q = quotes.get(ticker)
+            if q and q[1]:
+                curr, prev = q[0], q[1]
+                rows.append([name, curr, ((curr - prev) / prev) * 100])
+            else: rows.append([name, 0.0, 0.0])
+        final_dfs[cat] = pd.DataFrame(rows, columns=["Ativo", "Preço", "Var%"])
+        if trends is not None:
+            extra = trends.reindex(list(items.values())).reset_index(drop=True)
+            final_dfs[cat] = pd.concat([final_dfs[cat], extra], axis=1)
+    return final_dfs
+
+def fetch_market_quotes(downloader=yf_download):
+    # Um único round-trip para os 20 símbolos do Panorama
+    with span("fetch.market"):
+        try: data = downloader(MARKET_TICKERS, period="5d", progress=False)['Close']
+        except: data = pd.DataFrame()
+        quotes = market_quotes(data)
+    for t in MARKET_TICKERS:
+        if t not in quotes: inc("fetch_errors_total", source="market", symbol=t)
+    return quotes
+
+def fetch_market_data(downloader=yf_download):
+    return market_frames(fetch_market_quotes(downloader))
+
+class MarketRefresher:
+    """Mantém o snapshot do Panorama quente em uma thread de fundo (uma por processo).
+    Parte do que estiver no QuoteStore, então o primeiro acesso após um restart não espera o Yahoo.
+    Com shared (SharedQuoteCache), só uma réplica por intervalo busca; as outras leem o resultado.
+    Com history (HistoryStore), o histórico diário é estendido em segundo plano depois de cada
+    publicação e vira 1S/1M/YTD numa republicação."""
+    def __init__(self, fetch=fetch_market_quotes, interval=60, store=None, shared=None, history=None):
+        self.fetch, self.interval, self.store, self.shared, self.history = fetch, interval, store, shared, history
+        self.quotes, self.snapshot, self.version = {}, None, 0
+        self.refreshes, self.last_duration = 0, 0.0
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _publish(self, quotes):
+        # Símbolos que não vieram no refresh mantêm o último valor bom (e o horário dele)
+        with self._lock:
+            self.quotes = {**self.quotes, **quotes}
+            self.snapshot = market_frames(self.quotes, self._trends())
+            self.version += 1
+        self._ready.set()
+
+    def _trends(self):
+        if self.history is None: return None
+        try: return self.history.trends(MARKET_TICKERS)
+        except:
+            inc("stage_failures_total", stage="market_trends")
+            return None
+
+    def seed(self):
+        if self.store is None: return
+        try:
+            stored = self.store.load(MARKET_TICKERS)
+            if stored: self._publish(stored)
+        except: inc("stage_failures_total", stage="market_seed")
+
+    def refresh(self):
+        with span("market.refresh"): return self._refresh()
+
+    def _refresh(self):
+        start = time.perf_counter()
+        now = time.time()
+        stored = {}
+        if self.store is not None:
+            # Outro worker do host pode ter acabado de atualizar: reaproveita sem ir ao Yahoo
+            try: stored = self.store.load(MARKET_TICKERS)
+            except:
+                inc("stage_failures_total", stage="quote_store_read", source="market")
+                stored = {}
+        if len(stored) == len(MARKET_TICKERS) and all(now - q[2] < self.interval for q in stored.values()):
+            inc("cache_requests_total", cache="quote_store", result="hit")
+            fresh = stored
+        else:
+            if self.store is not None: inc("cache_requests_total", cache="quote_store", result="miss")
+            if self.shared is not None:
+                got = self.shared.refresh("market", MARKET_TICKERS, lambda _: self.fetch(), self.interval, budget=MARKET_BUDGET)
+                fresh = {s: (c, p, at) for s, ((c, p), at) in got.items()}
+            else: fresh = {s: (c, p, now) for s, (c, p) in self.fetch().items()}
+            if self.store is not None and fresh:
+                try: self.store.upsert({s: (c, p) for s, (c, p, _) in fresh.items()}, ts=min(q[2] for q in fresh.values()))
+                except: inc("stage_failures_total", stage="quote_store_write", source="market")
+        # Cotações primeiro: o backfill do histórico (e o append a cada HISTORY_TTL) roda numa
+        # thread à parte e republica o snapshot só com as tendências novas
+        self._publish(fresh)
+        if self.history is not None:
+            try: self.history.update_async(MARKET_TICKERS, done=self._history_done)
+            except: inc("stage_failures_total", stage="history_update")
+        with self._lock:
+            self.refreshes += 1
+            self.last_duration = time.perf_counter() - start
+        return self.snapshot
+
+    def _history_done(self, changed):
+        if changed: self._publish({})
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try: self.refresh()
+            except: inc("stage_failures_total", stage="market_refresh")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread and self._thread.is_alive(): return self
+        self.seed()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="market-refresher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread: self._thread.join()
+
+    def get(self, timeout=15):
+        # Só espera no primeiro carregamento sem nada no disco; depois é leitura de memória
+        return self.versioned(timeout)[1]
+
+    def versioned(self, timeout=15):
+        # (versão, frames) lidos juntos: a versão serve de chave para o que for derivado dos frames
+        self._ready.wait(timeout)
+        with self._lock: version, snap = self.version, self.snapshot
+        return version, snap if snap is not None else market_frames({})
+
+    def ages(self):
+        # Segundos desde a última cotação boa de cada símbolo (None se nunca houve)
+        now = time.time()
+        with self._lock: quotes = self.quotes
+        return {t: now - quotes[t][2] if t in quotes else None for t in MARKET_TICKERS}
+
+BR_CHUNK_SIZE = 50
+BR_MAX_WORKERS = 4
+BR_RETRIES = 2
+BR_TIMEOUT = 10
+BR_TTL = 300
+BR_DEADLINE_SLACK = 5
+
+def last_closes(data, sa_tickers):
+    close = data['Close']
+    if isinstance(close, pd.Series):
+        close = close.dropna()
+        return {sa_tickers[0]: close.iloc[-1]} if len(close) else {}
+    last = close.iloc[-1]
+    return {t: last[t] for t in sa_tickers if t in last.index and pd.notna(last[t])}
+
+def fetch_price_chunk(chunk, downloader=yf_download, retries=BR_RETRIES, timeout=BR_TIMEOUT):
+    # O yf.download raramente levanta exceção por símbolo ruim (devolve coluna NaN), então a nova
+    # tentativa pede de novo só os tickers que ainda faltam, tenha a chamada falhado ou não
+    prices, error, attempts, pending = {}, None, 0, list(chunk)
+    start = time.perf_counter()
+    with span("fetch.br_chunk"):
+        for attempts in range(1, retries + 2):
+            sa_tickers = [f"{t}.SA" for t in pending]
+            try:
+                found = last_closes(downloader(sa_tickers, period="1d", progress=False, timeout=timeout), sa_tickers)
+                prices.update({t: found[f"{t}.SA"] for t in pending if f"{t}.SA" in found})
+                error = None
+            except Exception as e: error = repr(e)
+            pending = [t for t in pending if t not in prices]
+            if not pending: break
+    if attempts > 1: inc("fetch_retries_total", attempts - 1, source="br")
+    for t in pending: inc("fetch_errors_total", source="br", symbol=t)
+    metric = {'tickers': len(chunk), 'found': len(prices), 'missing': len(pending), 'attempts': attempts,
+              'seconds': time.perf_counter() - start, 'error': error}
+    return prices, metric
+
+def chunk_budget(retries=BR_RETRIES, timeout=BR_TIMEOUT, slack=BR_DEADLINE_SLACK):
+    # Pior caso de um lote: todas as tentativas no timeout + folga
+    return timeout * (retries + 1) + slack
+
+# O Panorama é uma chamada só, sem nova tentativa
+MARKET_BUDGET = chunk_budget(retries=0)
+
+def fetch_deadline(chunks, downloader, max_workers, retries=BR_RETRIES, timeout=BR_TIMEOUT, slack=BR_DEADLINE_SLACK):
+    # Lotes rodam em ondas de max_workers; com downloader serializado, um de cada vez
+    waves = chunks if getattr(downloader, 'serialized', False) else math.ceil(chunks / max(1, max_workers))
+    return chunk_budget(retries, timeout, slack) * waves
+
+def br_fetch_budget(count, chunk_size=BR_CHUNK_SIZE, max_workers=BR_MAX_WORKERS):
+    # Pior caso do fetch_br_prices de produção para count tickers (TTL do lock compartilhado)
+    return fetch_deadline(math.ceil(count / chunk_size), yf_download, max_workers)
+
+def fetch_br_prices(ticker_list, downloader=yf_download, chunk_size=BR_CHUNK_SIZE,
+                    max_workers=BR_MAX_WORKERS, retries=BR_RETRIES, timeout=BR_TIMEOUT, slack=BR_DEADLINE_SLACK):
+    """Busca as cotações em lotes concorrentes. Um lote que falha perde só os próprios tickers.
+    Retorna (preços, métricas por lote)."""
+    if not ticker_list: return {}, []
+    chunks = [ticker_list[i:i + chunk_size] for i in range(0, len(ticker_list), chunk_size)]
+    prices, metrics = {}, []
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)), thread_name_prefix="br-prices")
+    futures = [pool.submit(fetch_price_chunk, c, downloader, retries, timeout) for c in chunks]
+    # Prazo do conjunto: pior caso de um lote vezes o número de ondas (lotes em sequência)
+    deadline = time.perf_counter() + fetch_deadline(len(chunks), downloader, max_workers, retries, timeout, slack)
+    for i, (chunk, fut) in enumerate(zip(chunks, futures)):
+        try: found, metric = fut.result(timeout=max(0.0, deadline - time.perf_counter()))
+        except Exception as e:
+            inc("fetch_timeouts_total", source="br")
+            found, metric = {}, {'tickers': len(chunk), 'found': 0, 'missing': len(chunk), 'attempts': 0,
+                                 'seconds': None, 'error': repr(e)}
+        prices.update(found)
+        metrics.append(dict(metric, chunk=i))
+    pool.shutdown(wait=False, cancel_futures=True)
+    return prices, metrics
+
+def get_br_prices_stored(ticker_list, store, fetch=fetch_br_prices, ttl=BR_TTL, fallback=True, shared=None):
+    # Preços recentes no QuoteStore (gravados por qualquer worker do host) não vão ao Yahoo;
+    # o que faltar é buscado e gravado, e o que falhar cai para o último valor conhecido.
+    # Com shared, o que falta passa antes pelo cache das réplicas (uma só busca por vez).
+    sa = {t: f"{t}.SA" for t in ticker_list}
+    now = time.time()
+    try: stored = store.load(sa.values())
+    except:
+        inc("stage_failures_total", stage="quote_store_read", source="br")
+        stored = {}
+    prices = {t: stored[s][0] for t, s in sa.items() if s in stored and now - stored[s][2] < ttl}
+    missing = [t for t in ticker_list if t not in prices]
+    inc("cache_requests_total", len(prices), cache="quote_store", result="hit")
+    inc("cache_requests_total", len(missing), cache="quote_store", result="miss")
+    if shared is not None and missing:
+        metrics = []
+        def fetch_missing(symbols):
+            found, chunk_metrics = fetch(symbols)
+            metrics.extend(chunk_metrics)
+            return found
+        got = shared.refresh("br", missing, fetch_missing, ttl, budget=br_fetch_budget(len(missing)))
+        fetched = {t: v for t, (v, at) in got.items() if now - at < ttl}
+        stamp = min((got[t][1] for t in fetched), default=now)
+    else: (fetched, metrics), stamp = fetch(missing), now
+    try: store.upsert({sa[t]: (p, None) for t, p in fetched.items()}, ts=stamp)
+    except: inc("stage_failures_total", stage="quote_store_write", source="br")
+    prices.update(fetched)
+    if fallback:
+        for t in missing:
+            if t not in prices and sa[t] in stored: prices[t] = stored[sa[t]][0]
+    return prices, metrics
+
+STREAM_INTERVAL = 30
+# Tickers com a última barra na mesma janela dividem uma chamada. Quem está parado há mais que
+# STREAM_IDLE_AFTER (pregão fechado, fim de semana, papel sem liquidez) ou nunca trouxe barra
+# só é consultado a cada STREAM_IDLE_INTERVAL, sempre a partir da própria última barra
+STREAM_BUCKET = 300
+STREAM_IDLE_AFTER = 3600
+STREAM_IDLE_INTERVAL = 600
+
+def fetch_latest_bars(tickers, since=None, downloader=yf_download):
+    # Só as barras de 1 minuto a partir da última já vista (ou do dia, no primeiro poll)
+    sa_tickers = [f"{t}.SA" for t in tickers]
+    span_kw = {'start': datetime.datetime.fromtimestamp(since, pytz.utc)} if since is not None else {'period': '1d'}
+    data = downloader(sa_tickers, interval="1m", progress=False, timeout=BR_TIMEOUT, **span_kw)['Close']
+    if isinstance(data, pd.Series): data = data.to_frame(sa_tickers[0])
+    bars = {}
+    for t, sa in zip(tickers, sa_tickers):
+        if sa not in data.columns: continue
+        series = data[sa].dropna()
+        if len(series): bars[t] = (float(series.iloc[-1]), series.index[-1].timestamp())
+    return bars
+
+class PriceStream:
+    """Poller de fundo das cotações do radar. Cada poll pede só as barras novas e aplica deltas numa
+    tabela compartilhada; cada ticker guarda a versão em que mudou, para o front redesenhar só o que mudou."""
+    def __init__(self, fetch_bars=fetch_latest_bars, interval=STREAM_INTERVAL, store=None, chunk_size=BR_CHUNK_SIZE,
+                 bucket=STREAM_BUCKET, idle_after=STREAM_IDLE_AFTER, idle_interval=STREAM_IDLE_INTERVAL, clock=time.time):
+        self.fetch_bars, self.interval, self.store, self.chunk_size = fetch_bars, interval, store, chunk_size
+        self.bucket, self.idle_after, self.idle_interval, self.clock = bucket, idle_after, idle_interval, clock
+        self.prices, self.changed_at, self._polled = {}, {}, {}
+        self.version, self.polls, self.errors = 0, 0, 0
+        self._tickers = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def track(self, tickers):
+        with self._lock: self._tickers.update(tickers)
+        return self.start()
+
+    def _groups(self):
+        # Agrupa pela janela da última barra de cada ticker (como o HistoryStore faz por dia): um
+        # ticker parado não alarga o pedido dos outros. Só quem nunca teve barra pede o dia inteiro
+        now, buckets = self.clock(), {}
+        with self._lock:
+            for t in sorted(self._tickers):
+                ts, polled = self.prices[t][1] if t in self.prices else None, self._polled.get(t)
+                idle = polled is not None and (ts is None or now - ts > self.idle_after)
+                if idle and now - polled < self.idle_interval: continue
+                self._polled[t] = now
+                buckets.setdefault(None if ts is None else ts // self.bucket * self.bucket, []).append(t)
+        groups = sorted(buckets.items(), key=lambda g: (g[0] is not None, g[0] or 0))
+        return [(g[i:i + self.chunk_size], s) for s, g in groups for i in range(0, len(g), self.chunk_size)]
+
+    def apply(self, bars):
+        # Aplica um lote {ticker: (preço, horário da barra)} e devolve os tickers cujo preço mudou;
+        # barra mais velha que a guardada é ignorada e não conta como mudança
+        with self._lock:
+            changed = []
+            for t, (p, ts) in bars.items():
+                old = self.prices.get(t)
+                if old is not None and ts < old[1]: continue
+                self.prices[t] = (p, ts)
+                if old is None or old[0] != p: changed.append(t)
+            if changed:
+                self.version += 1
+                for t in changed: self.changed_at[t] = self.version
+        return changed
+
+    def poll(self):
+        with span("stream.poll"): return self._poll()
+
+    def _poll(self):
+        updates = {}
+        for chunk, since in self._groups():
+            try: bars = self.fetch_bars(chunk, since)
+            except:
+                with self._lock: self.errors += 1
+                for t in chunk: inc("fetch_errors_total", source="stream", symbol=t)
+                continue
+            changed = self.apply(bars)
+            updates.update({t: bars[t][0] for t in changed})
+        if self.store is not None and updates:
+            try: self.store.upsert({f"{t}.SA": (p, None) for t, p in updates.items()})
+            except: inc("stage_failures_total", stage="quote_store_write", source="stream")
+        with self._lock: self.polls += 1
+        return updates
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try: self.poll()
+            except: inc("stage_failures_total", stage="stream_poll")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread and self._thread.is_alive(): return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="price-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread: self._thread.join()
+
+    def deltas_since(self, version):
+        # (versão atual, {ticker: preço} dos que mudaram depois de `version`)
+        with self._lock:
+            return self.version, {t: self.prices[t][0] for t, v in self.changed_at.items() if v > version}
@@ -0,0 +1,57 @@
+"""Formatação vetorizada das tabelas e rótulos de frescor dos dados."""
+import datetime
+import numpy as np
+import pytz
+
+TABLE_PAGE_SIZE = 50
+CSS_UP, CSS_UP_BOLD = 'color: #00ff9d; font-weight: 600;', 'color: #00ff9d; font-weight: 700;'
+CSS_DOWN, CSS_DOWN_BOLD = 'color: #ff4d4d; font-weight: 600;', 'color: #ff4d4d; font-weight: 700;'
+CSS_MUTED = 'color: #666;'
+
+# Formato por coluna: (padrão printf, texto para zero ou None); NaN vira '-'
+TREND_FORMATS = (('1S%', '%+.1f%%', None), ('1M%', '%+.1f%%', None), ('YTD%', '%+.1f%%', None))
+MARKET_FORMATS = (('Preço', '%.2f', '-'), ('Var%', '%+.2f%%', None)) + TREND_FORMATS
+RADAR_FORMATS = (('BAZIN_F', 'R$ %.2f', None), ('PRECO_F', 'R$ %.2f', None), ('MARGEM_VAL', '%+.1f%%', None)) + TREND_FORMATS
+DIV_FORMATS = (('DPA_F', 'R$ %.2f', None), ('DY_F', '%.2f%%', None))
+# Cor por coluna: (coluna, acima de, css, abaixo de ou None, css, css padrão)
+TREND_TONES = tuple((col, 0, CSS_UP, 0, CSS_DOWN, CSS_MUTED) for col, _, _ in TREND_FORMATS)
+MARKET_TONES = (('Var%', 0, CSS_UP, 0, CSS_DOWN, CSS_MUTED),) + TREND_TONES
+RADAR_TONES = (('MARGEM_VAL', 10, CSS_UP_BOLD, 0, CSS_DOWN_BOLD, CSS_MUTED),) + TREND_TONES
+DIV_TONES = (('DY_F', 8, CSS_UP_BOLD, None, None, CSS_MUTED),)
+
+def format_column(values, pattern, zero=None):
+    arr = np.asarray(values, dtype=float)
+    out = np.char.mod(pattern, arr).astype(object)
+    if zero is not None: out[arr == 0] = zero
+    out[np.isnan(arr)] = '-'
+    return out
+
+def format_table(df, formats, tones):
+    # Texto e CSS calculados por coluna inteira (sem callback por célula), cacheados pelo conteúdo do frame.
+    # Colunas ausentes (ex.: tendências sem histórico) são ignoradas
+    text = df.copy()
+    for col, pattern, zero in formats:
+        if col in df: text[col] = format_column(df[col], pattern, zero)
+    css = {}
+    for col, hi, hi_css, lo, lo_css, default in tones:
+        if col not in df: continue
+        v = df[col].to_numpy(dtype=float)
+        conds, choices = [v > hi], [hi_css]
+        if lo is not None: conds, choices = conds + [v < lo], choices + [lo_css]
+        css[col] = np.select(conds, choices, default).astype(object)
+    return text, css
+
+def table_page(text, css, page, page_size=TABLE_PAGE_SIZE):
+    start = (page - 1) * page_size
+    return text.iloc[start:start + page_size], {c: v[start:start + page_size] for c, v in css.items()}
+
+def freshness_label(ages, max_age=180):
+    # "LIVE DATA" só quando todos os símbolos são recentes; do contrário diz quantos estão ao vivo
+    # e de quando é o dado mais antigo servido
+    known = [a for a in ages.values() if a is not None]
+    if not known: return "SEM DADOS"
+    fresh = sum(a < max_age for a in known)
+    if fresh == len(ages): return "LIVE DATA"
+    stamp = datetime.datetime.now(pytz.timezone('America/Sao_Paulo')) - datetime.timedelta(seconds=max(known))
+    if fresh: return f"LIVE {fresh}/{len(ages)} • DEMAIS DE {stamp.strftime('%H:%M')}"
+    return f"DADOS DE {stamp.strftime('%d/%m %H:%M')} • ATUALIZANDO"
@@ -0,0 +1,67 @@
+"""Cenários what-if do Radar: teto recalculado como DPA / yield alvo, sob choques de preço.
+
+Todos os cenários da grade (yields × choques) saem de um único broadcast NumPy sobre os vetores
+de DPA e preço; depois disso, trocar de cenário é uma consulta num dict.
+"""
+import numpy as np
+import pandas as pd
+
+from .metrics import span
+
+# Grade dos sliders, em %: yield alvo (Bazin clássico = 6%) e choque sobre a cotação atual
+SCENARIO_YIELDS = tuple(float(v) for v in np.round(np.arange(4.0, 12.01, 0.5), 1))
+SCENARIO_SHOCKS = tuple(range(-30, 31, 5))
+OPPORTUNITY_MARGIN = 10
+
+def scenario_margins(dpa, preco, yields, shocks):
+    """(yields, choques, ativos): margem % do teto DPA/yield sobre o preço chocado;
+    -999 sinaliza ativo sem cotação, como em margin_values."""
+    dpa, preco = np.asarray(dpa, dtype=float), np.asarray(preco, dtype=float)
+    ceilings = dpa[None, :] / (np.asarray(yields, dtype=float)[:, None] / 100)
+    shocked = preco[None, :] * (1 + np.asarray(shocks, dtype=float)[:, None] / 100)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        margins = (ceilings[:, None, :] - shocked[None, :, :]) / shocked[None, :, :] * 100
+    return np.where(shocked[None, :, :] > 0, margins, -999.0)
+
+class ScenarioGrid:
+    """Margens e contagem de oportunidades (> threshold) de todos os cenários da grade, calculadas
+    na construção. Cenários fora da grade são calculados sob demanda e guardados também."""
+    def __init__(self, dpa, preco, yields=SCENARIO_YIELDS, shocks=SCENARIO_SHOCKS, threshold=OPPORTUNITY_MARGIN):
+        self.dpa, self.preco = np.asarray(dpa, dtype=float), np.asarray(preco, dtype=float)
+        self.yields, self.shocks, self.threshold = tuple(yields), tuple(shocks), threshold
+        with span("scenarios.grid"):
+            self.margins = scenario_margins(self.dpa, self.preco, self.yields, self.shocks)
+            self.counts = (self.margins > threshold).sum(axis=2)
+        self._pos = {(float(y), float(s)): (i, j) for i, y in enumerate(self.yields) for j, s in enumerate(self.shocks)}
+        self._extra = {}
+
+    def margin(self, target_yield, shock=0):
+        key = (float(target_yield), float(shock))
+        pos = self._pos.get(key)
+        if pos is not None: return self.margins[pos]
+        if key not in self._extra: self._extra[key] = scenario_margins(self.dpa, self.preco, [key[0]], [key[1]])[0, 0]
+        return self._extra[key]
+
+    def count(self, target_yield, shock=0):
+        pos = self._pos.get((float(target_yield), float(shock)))
+        if pos is not None: return int(self.counts[pos])
+        return int((self.margin(target_yield, shock) > self.threshold).sum())
+
+    def ceilings(self, target_yield):
+        return self.dpa / (target_yield / 100)
+
+    def counts_frame(self):
+        # Oportunidades por cenário: linhas = yield alvo, colunas = choque de preço
+        return pd.DataFrame(self.counts, index=[f"{y:.1f}%" for y in self.yields], columns=[f"{s:+g}%" for s in self.shocks])
+
+def apply_scenario(radar, grid, target_yield, shock=0):
+    # Radar com teto e margem do cenário (mesma ordem de linhas usada para montar a grade), reordenado
+    preco = radar['PRECO_F'] * (1 + shock / 100)
+    out = radar.assign(BAZIN_F=grid.ceilings(target_yield), PRECO_F=preco,
+                       MARGEM_VAL=grid.margin(target_yield, shock))
+    return out.sort_values('MARGEM_VAL', ascending=False)
+
+def scenario_inputs(radar, static):
+    # DPA da planilha alinhado às linhas do radar, e o preço atual de cada uma
+    dpa = radar['TICKER_F'].map(static.drop_duplicates('TICKER_F').set_index('TICKER_F')['DPA_F']).fillna(0.0)
+    return dpa.to_numpy(dtype=float), radar['PRECO_F'].to_numpy(dtype=float)
@@ -0,0 +1,69 @@
+"""Índice de busca das caixas de pesquisa por ticker e empresa."""
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+def fold_text(text):
+    # Minúsculas e sem acentos: "Ações" e "acoes" batem
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+def build_postings(texts, sizes=(1, 2, 3)):
+    # {n-grama: posições ordenadas}, fatiando a coluna Arrow inteira por deslocamento (sem loop por linha)
+    lens = pc.utf8_length(texts).to_numpy(zero_copy_only=False)
+    grams, rows = [], []
+    for n in sizes:
+        for j in range(int(lens.max(initial=0)) - n + 1):
+            ok = lens >= j + n
+            g = pc.utf8_slice_codeunits(texts.filter(pa.array(ok)), j, j + n)
+            # \0 separa os campos: n-gramas que atravessam de um para o outro ficam fora
+            keep = pc.invert(pc.match_substring(g, "\0")).to_numpy(zero_copy_only=False)
+            grams.append(g.filter(pa.array(keep)))
+            rows.append(np.flatnonzero(ok)[keep])
+    if not rows: return {}
+    codes, uniques = pd.factorize(pd.array(pa.chunked_array(grams, pa.string()), dtype=pd.ArrowDtype(pa.string())))
+    rows = np.concatenate(rows)
+    order = np.lexsort((rows, codes))
+    codes, rows = codes[order], rows[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])
+    codes, rows = codes[first], rows[first]
+    bounds = np.searchsorted(codes, np.arange(len(uniques) + 1))
+    return {g: rows[bounds[i]:bounds[i + 1]] for i, g in enumerate(uniques)}
+
+class SearchIndex:
+    """Busca por substring em empresa e ticker sem regex nem cópia do frame por tecla.
+    Postings de 1, 2 e 3-gramas dão a resposta direta para consultas curtas; nas longas, a
+    interseção dos trigramas reduz os candidatos e um match_substring do Arrow confirma."""
+    def __init__(self, labels, names, tickers):
+        self.labels = np.asarray(labels)
+        self._texts = pa.array([f"{fold_text(n)}\0{fold_text(t)}" for n, t in zip(names, tickers)], pa.string())
+        self._grams = build_postings(self._texts)
+        self._empty = np.array([], dtype=np.int64)
+
+    def positions(self, query):
+        q = fold_text(query)
+        if not q: return np.arange(len(self._texts))
+        if len(q) <= 3: return self._grams.get(q, self._empty)
+        postings = sorted((self._grams.get(q[j:j + 3], self._empty) for j in range(len(q) - 2)), key=len)
+        cands = postings[0]
+        mask = np.zeros(len(self._texts), dtype=bool)
+        for p in postings[1:]:
+            if not len(cands): break
+            mask[:] = False
+            mask[p] = True
+            cands = cands[mask[cands]]
+        if not len(cands): return cands
+        hit = pc.match_substring(self._texts.take(pa.array(cands)), q).to_numpy(zero_copy_only=False)
+        return cands[hit]
+
+    def search(self, query):
+        # Rótulos (índice do frame estático) das linhas que contêm a consulta
+        return self.labels[self.positions(query)]
+
+def search_rows(df, index, query):
+    if not query or index is None: return df
+    return df[df.index.isin(index.search(query))]
@@ -0,0 +1,229 @@
+"""Estágio estático: leitura e limpeza da planilha de fundamentos e as visões do radar."""
+import os
+import glob
+import hashlib
+import threading
+import pandas as pd
+import numpy as np
+
+from .cache import CACHE_DIR
+from .metrics import inc, span
+
+# Versão do formato do frame limpo: suba ao mudar clean_fundamentals, merge_sources, LOGO_SITES ou
+# as colunas, para que sidecars gravados pelo código anterior não sejam reaproveitados
+SHEET_SCHEMA = 2
+
+def clean_currency(x):
+    if isinstance(x, (int, float)): return float(x)
+    if isinstance(x, str):
+        try: return float(x.replace('R$', '').replace('.', '').replace(',', '.').replace('%', '').strip())
+        except: return 0.0
+    return 0.0
+
+def clean_dy_percentage(x):
+    val = clean_currency(x)
+    return val * 100 if 0 < val < 1.0 else val
+
+def clean_currency_series(s):
+    # Versão vetorizada de clean_currency: mesmos valores, sem apply por célula
+    if pd.api.types.is_numeric_dtype(s): return s.astype(float)
+    vals = s.to_numpy(dtype=object)
+    types = np.frompyfunc(type, 1, 1)(vals)
+    kinds = set(types)
+    is_num = np.isin(types, [t for t in kinds if issubclass(t, (int, float))])
+    is_str = np.isin(types, [t for t in kinds if issubclass(t, str)])
+    out = np.zeros(len(vals))
+    if is_num.any(): out[is_num] = vals[is_num].astype(float)
+    if is_str.any():
+        # Strings em Arrow: replace/strip e o cast para float rodam em C, não em loop Python
+        txt = pd.Series(vals[is_str], dtype='string[pyarrow]').str.replace('R$', '', regex=False) \
+            .str.replace('.', '', regex=False).str.replace(',', '.', regex=False).str.replace('%', '', regex=False).str.strip()
+        try: parsed = txt.astype('float64')
+        except Exception: parsed = pd.to_numeric(txt, errors='coerce')
+        parsed = parsed.to_numpy(dtype=float, na_value=np.nan)
+        # Casos raros (texto inválido, "nan", "1_000"...) seguem pela função escalar
+        bad = np.isnan(parsed)
+        if bad.any(): parsed[bad] = [clean_currency(x) for x in vals[is_str][bad]]
+        out[is_str] = parsed
+    return pd.Series(out, index=s.index)
+
+def clean_dy_series(s):
+    val = clean_currency_series(s)
+    return pd.Series(np.where((val > 0) & (val < 1.0), val * 100, val), index=s.index)
+
+LOGO_SITES = {
+    'CXSE3': 'caixaseguradora.com.br', 'BBSE3': 'bbseguros.com.br', 'ODPV3': 'odontoprev.com.br',
+    'BBAS3': 'bb.com.br', 'ABCB4': 'abcbrasil.com.br', 'ITUB4': 'itau.com.br',
+    'ISAE4': 'isaenergiabrasil.com.br', 'TRPL4': 'isaenergiabrasil.com.br',
+    'CMIG4': 'cemig.com.br', 'SAPR4': 'sanepar.com.br', 'SAPR11': 'sanepar.com.br',
+    'PETR4': 'petrobras.com.br', 'RANI3': 'irani.com.br', 'KLBN11': 'klabin.com.br',
+    'KLBN4': 'klabin.com.br', 'IRBR3': 'ri.irbre.com', 'FLRY3': 'fleury.com.br',
+    'PSSA3': 'portoseguro.com.br', 'WEGE3': 'weg.net', 'VALE3': 'vale.com',
+    'ABEV3': 'ambev.com.br', 'B3SA3': 'b3.com.br', 'EGIE3': 'engie.com.br'
+}
+
+def get_logo_url(ticker):
+    if not isinstance(ticker, str): return ""
+    clean = ticker.replace('.SA', '').strip().upper()
+    if clean in LOGO_SITES: return f"https://www.google.com/s2/favicons?domain={LOGO_SITES[clean]}&sz=128"
+    if clean in ['BTC','BITCOIN']: return "https://assets.coingecko.com/coins/images/1/small/bitcoin.png"
+    if clean in ['ETH','ETHEREUM']: return "https://assets.coingecko.com/coins/images/279/small/ethereum.png"
+    if clean in ['SOL','SOLANA']: return "https://assets.coingecko.com/coins/images/4128/small/solana.png"
+    return f"https://cdn.jsdelivr.net/gh/thefintz/icon-project@master/stock_logos/{clean}.png"
+
+def map_logos(tickers):
+    # Resolve cada ticker único uma vez só
+    return tickers.map({t: get_logo_url(t) for t in tickers.unique()})
+
+SPREADSHEET_FILES = ("PEC.xlsx", "PEC - Página1.csv")
+STATIC_COLUMNS = ['TICKER_F', 'BAZIN_F', 'DY_F', 'DPA_F', 'Ativo', 'Logo']
+
+def find_spreadsheet():
+    return next((p for p in SPREADSHEET_FILES if os.path.exists(p)), None)
+
+def file_signature(path):
+    info = os.stat(path)
+    return (os.path.abspath(path), info.st_mtime_ns, info.st_size)
+
+def read_fundamentals(path):
+    # Primeira aba com coluna BAZIN (ou o CSV inteiro), ainda sem limpeza
+    target_df = pd.DataFrame()
+    if path.lower().endswith(".xlsx"):
+        with pd.ExcelFile(path) as file_data:
+            for sheet in file_data.sheet_names:
+                temp = pd.read_excel(file_data, sheet)
+                if any("BAZIN" in str(c).upper() for c in temp.columns):
+                    target_df = temp; break
+    else: target_df = pd.read_csv(path)
+    return target_df
+
+def dedupe_columns(names):
+    # Como o pandas faz ao ler arquivos: a segunda "DY" vira "DY.1", a terceira "DY.2"...
+    seen, out = set(), []
+    for name in names:
+        new, i = name, 0
+        while new in seen:
+            i += 1
+            new = f"{name}.{i}"
+        seen.add(new)
+        out.append(new)
+    return out
+
+def clean_fundamentals(target_df):
+    # Fundamentos estáticos (sem cotações): ticker, teto, DY, DPA, empresa e logo
+    if target_df.empty: return pd.DataFrame(columns=STATIC_COLUMNS)
+    # Depois de normalizar, "Dy" e "DY " também colidem: vale a primeira
+    target_df.columns = dedupe_columns([str(c).strip().upper() for c in target_df.columns])
+    cols = target_df.columns
+    c_tick = next((c for c in cols if 'TICKER' in c), None)
+    c_baz = next((c for c in cols if 'BAZIN' in c), None)
+    c_dy = next((c for c in cols if 'DY' in c), None)
+    c_dpa = next((c for c in cols if 'DPA' in c), None)
+    c_emp = next((c for c in cols if 'EMPRESA' in c), None)
+    if not (c_tick and c_baz): return pd.DataFrame(columns=STATIC_COLUMNS)
+
+    target_df['TICKER_F'] = target_df[c_tick].astype(str).str.strip().str.upper()
+    target_df['BAZIN_F'] = clean_currency_series(target_df[c_baz])
+    target_df['DY_F'] = clean_dy_series(target_df[c_dy]) if c_dy else 0.0
+    target_df['DPA_F'] = clean_currency_series(target_df[c_dpa]) if c_dpa else 0.0
+    target_df['Logo'] = map_logos(target_df['TICKER_F'])
+    target_df['Ativo'] = target_df[c_emp] if c_emp else target_df['TICKER_F']
+    return target_df[STATIC_COLUMNS]
+
+def parse_spreadsheet(path):
+    with span("sheet.read"): raw = read_fundamentals(path)
+    with span("sheet.clean"): return clean_fundamentals(raw)
+
+class SheetCache:
+    """Planilha já limpa em memória, invalidada só quando o arquivo muda (caminho + mtime + tamanho).
+    Um sidecar Parquet em CACHE_DIR deixa o cold start sem passar pelo openpyxl. get() aceita também
+    uma tupla de caminhos (ingestão mesclada), invalidada quando qualquer um deles muda."""
+    def __init__(self, parse=parse_spreadsheet, cache_dir=CACHE_DIR):
+        self.parse, self.cache_dir = parse, cache_dir
+        self.hits = self.misses = self.sidecar_hits = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _sidecar_name(self, sig):
+        return os.path.basename(sig[0]) if isinstance(sig[0], str) else "ingest"
+
+    def _sidecar_path(self, sig):
+        digest = hashlib.sha1(repr((SHEET_SCHEMA, sig)).encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{self._sidecar_name(sig)}.{digest}.parquet")
+
+    def _read_sidecar(self, sig):
+        side = self._sidecar_path(sig)
+        if not os.path.exists(side): return None
+        try: return pd.read_parquet(side)
+        except:
+            inc("stage_failures_total", stage="sheet_sidecar_read")
+            return None
+
+    def _write_sidecar(self, sig, frame):
+        side = self._sidecar_path(sig)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for old in glob.glob(os.path.join(self.cache_dir, f"{glob.escape(self._sidecar_name(sig))}.*.parquet")):
+                if old != side: os.remove(old)
+            tmp = f"{side}.{os.getpid()}.tmp"
+            frame.to_parquet(tmp)
+            os.replace(tmp, side)
+        except: inc("stage_failures_total", stage="sheet_sidecar")
+
+    def get(self, path):
+        if isinstance(path, str): sig, key = file_signature(path), path
+        else: path = tuple(path); sig, key = tuple(file_signature(p) for p in path), path
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == sig:
+                self.hits += 1
+                inc("cache_requests_total", cache="sheet", result="hit")
+                return entry[1]
+            self.misses += 1
+            frame = self._read_sidecar(sig)
+            if frame is not None:
+                self.sidecar_hits += 1
+                inc("cache_requests_total", cache="sheet", result="sidecar")
+            else:
+                inc("cache_requests_total", cache="sheet", result="miss")
+                frame = self.parse(path)
+                self._write_sidecar(sig, frame)
+            self._entries[key] = (sig, frame)
+            return frame
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'sidecar_hits': self.sidecar_hits}
+
+def margin_values(bazin, preco):
+    # Margem até o teto em %; -999 sinaliza ativo sem cotação
+    b, p = bazin.to_numpy(dtype=float), preco.to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.Series(np.where(p > 0, (b - p) / p * 100, -999.0), index=bazin.index)
+
+RADAR_COLUMNS = ['Logo', 'Ativo', 'TICKER_F', 'BAZIN_F', 'PRECO_F', 'MARGEM_VAL']
+DIV_COLUMNS = ['Logo', 'Ativo', 'TICKER_F', 'DPA_F', 'DY_F']
+
+def apply_prices(static, prices):
+    # Estágio 2: join barato do vetor de preços; só PRECO_F, MARGEM_VAL e a ordenação mudam
+    radar = static[static['BAZIN_F'] > 0]
+    preco = radar['TICKER_F'].map(prices).fillna(0)
+    radar = radar.assign(PRECO_F=preco, MARGEM_VAL=margin_values(radar['BAZIN_F'], preco))
+    return radar[RADAR_COLUMNS].sort_values('MARGEM_VAL', ascending=False)
+
+def apply_price_deltas(radar, deltas):
+    # Recalcula só as linhas cujos preços mudaram e reordena
+    mask = radar['TICKER_F'].isin(list(deltas))
+    if not mask.any(): return radar
+    radar = radar.copy()
+    preco = radar.loc[mask, 'TICKER_F'].map(deltas)
+    radar.loc[mask, 'PRECO_F'] = preco
+    radar.loc[mask, 'MARGEM_VAL'] = margin_values(radar.loc[mask, 'BAZIN_F'], preco)
+    return radar.sort_values('MARGEM_VAL', ascending=False)
+
+def apply_trends(view, trends, suffix=".SA"):
+    # Junta retornos e sparkline do HistoryStore (indexado por símbolo com sufixo) pelo ticker
+    extra = trends.reindex(view['TICKER_F'] + suffix)
+    return view.assign(**{col: extra[col].to_numpy() for col in trends.columns})
+
+def dividend_view(static):
+    return static[static['DY_F'] > 0][DIV_COLUMNS].sort_values('DY_F', ascending=False)
@@ -0,0 +1,18 @@
+import pytest
+
+from engine.metrics import METRICS
+
+@pytest.fixture(autouse=True)
+def metrics():
+    # Registro global por processo: cada teste começa e termina zerado
+    METRICS.reset()
+    yield METRICS
+    METRICS.reset()
+
+@pytest.fixture
+def counter():
+    # counter(nome, **rótulos): soma dos contadores com esses rótulos
+    def total(name, **labels):
+        return sum(c['value'] for c in METRICS.snapshot()['counters']
+                   if c['name'] == name and all(c['labels'].get(k) == v for k, v in labels.items()))
+    return total
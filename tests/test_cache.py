@@ -0,0 +1,168 @@
+import threading
+import time
+
+from engine.cache import MemoryBackend, SharedQuoteCache, SWRCache
+
+class Clock:
+    def __init__(self, now=1000.0): self.now = now
+    def __call__(self): return self.now
+
+class Spawn:
+    # Guarda os refreshes de fundo para o teste rodá-los quando quiser
+    def __init__(self): self.pending = []
+    def __call__(self, fn): self.pending.append(fn)
+    def run(self):
+        pending, self.pending = self.pending, []
+        for fn in pending: fn()
+
+class Fetch:
+    def __init__(self, delay=0.0):
+        self.calls, self.delay, self.fail, self.value = 0, delay, False, 1.0
+        self._lock = threading.Lock()
+    def __call__(self):
+        with self._lock: self.calls += 1
+        if self.delay: time.sleep(self.delay)
+        if self.fail: raise RuntimeError("fonte fora do ar")
+        return {'A': self.value, 'B': self.value * 2}
+
+def make(ttl=60):
+    clock, spawn = Clock(), Spawn()
+    return SWRCache(ttl, clock=clock, spawn=spawn, name="test"), clock, spawn
+
+def test_first_access_fetches_once_under_concurrency():
+    cache, fetch = SWRCache(60, name="test"), Fetch(delay=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("k", fetch))) for _ in range(16)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert fetch.calls == 1
+    assert results == [{'A': 1.0, 'B': 2.0}] * 16
+
+def test_expired_entry_refreshes_once_in_background():
+    cache, clock, spawn = make()
+    fetch = Fetch()
+    cache.get("k", fetch)
+    clock.now += 60
+    fetch.value = 3.0
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("k", fetch))) for _ in range(16)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    # Todos recebem o valor antigo na hora; um só refresh foi agendado
+    assert results == [{'A': 1.0, 'B': 2.0}] * 16
+    assert len(spawn.pending) == 1 and fetch.calls == 1
+    spawn.run()
+    assert fetch.calls == 2 and cache.get("k", fetch) == {'A': 3.0, 'B': 6.0}
+
+def test_failure_keeps_last_good_value_and_its_age():
+    cache, clock, spawn = make()
+    fetch = Fetch()
+    cache.get("k", fetch)
+    clock.now += 90
+    fetch.fail = True
+    assert cache.get("k", fetch) == {'A': 1.0, 'B': 2.0}
+    spawn.run()
+    assert cache.failures == 1
+    assert cache.get("k", fetch) == {'A': 1.0, 'B': 2.0}
+    assert cache.ages("k") == {'A': 90.0, 'B': 90.0}
+
+def test_retry_waits_a_full_ttl_after_failure():
+    cache, clock, spawn = make(ttl=60)
+    fetch = Fetch()
+    cache.get("k", fetch)
+    clock.now += 60
+    fetch.fail = True
+    cache.get("k", fetch)
+    spawn.run()
+    fetch.fail = False
+    clock.now += 59
+    cache.get("k", fetch)
+    assert spawn.pending == []
+    clock.now += 1
+    cache.get("k", fetch)
+    assert len(spawn.pending) == 1
+    spawn.run()
+    assert fetch.calls == 3 and cache.refreshes == 2
+
+def test_seed_is_served_while_first_refresh_runs():
+    cache, clock, spawn = make()
+    fetch = Fetch()
+    seed = lambda: {'A': (0.5, clock.now - 3600)}
+    assert cache.get("k", fetch, seed) == {'A': 0.5}
+    assert fetch.calls == 0 and len(spawn.pending) == 1
+    assert cache.ages("k") == {'A': 3600.0}
+    spawn.run()
+    assert cache.get("k", fetch, seed) == {'A': 1.0, 'B': 2.0}
+    assert cache.ages("k") == {'A': 0.0, 'B': 0.0}
+
+def test_empty_seed_fetches_synchronously():
+    cache, _, spawn = make()
+    fetch = Fetch()
+    assert cache.get("k", fetch, seed=lambda: {}) == {'A': 1.0, 'B': 2.0}
+    assert fetch.calls == 1 and spawn.pending == []
+
+def test_slow_seed_does_not_block_other_keys():
+    cache, _, spawn = make()
+    cache.get("warm", Fetch())
+    entered, release = threading.Event(), threading.Event()
+    def seed():
+        entered.set()
+        release.wait(5)
+        return {'A': (0.5, 0.0)}
+    cold = threading.Thread(target=lambda: cache.get("cold", Fetch(), seed))
+    cold.start()
+    entered.wait()
+    start = time.perf_counter()
+    assert cache.get("warm", Fetch()) == {'A': 1.0, 'B': 2.0}
+    assert cache.ages("warm") == {'A': 0.0, 'B': 0.0}
+    assert time.perf_counter() - start < 1
+    release.set()
+    cold.join()
+    assert cache.get("cold", Fetch()) == {'A': 0.5}
+
+def test_shared_waiter_fetches_symbols_the_holder_did_not():
+    backend, calls = MemoryBackend(), []
+    started = threading.Event()
+    def slow(symbols):
+        calls.append(list(symbols))
+        started.set()
+        time.sleep(0.1)
+        return {s: 1.0 for s in symbols}
+    a, b = SharedQuoteCache(backend, poll=0.01), SharedQuoteCache(backend, poll=0.01)
+    holder = threading.Thread(target=lambda: a.refresh("br", ["X"], slow, 60))
+    holder.start()
+    started.wait()
+    got = b.refresh("br", ["Y"], lambda symbols: calls.append(list(symbols)) or {s: 2.0 for s in symbols}, 60)
+    holder.join()
+    assert {s: v for s, (v, _) in got.items()} == {"Y": 2.0}
+    assert calls == [["X"], ["Y"]] and b.waits == 1 and b.fetches == 1
+
+def test_shared_waiter_reuses_what_the_holder_fetched():
+    backend, calls = MemoryBackend(), []
+    started = threading.Event()
+    def slow(symbols):
+        calls.append(list(symbols))
+        started.set()
+        time.sleep(0.1)
+        return {s: 1.0 for s in symbols}
+    a, b = SharedQuoteCache(backend, poll=0.01), SharedQuoteCache(backend, poll=0.01)
+    holder = threading.Thread(target=lambda: a.refresh("br", ["X", "Y"], slow, 60))
+    holder.start()
+    started.wait()
+    got = b.refresh("br", ["Y"], slow, 60)
+    holder.join()
+    assert {s: v for s, (v, _) in got.items()} == {"Y": 1.0}
+    assert calls == [["X", "Y"]] and b.fetches == 0
+
+def test_lock_ttl_follows_the_fetch_budget():
+    # Um fetch mais longo que lock_ttl, mas dentro do orçamento, não perde o lock no meio
+    clock = Clock()
+    backend = MemoryBackend(clock=clock)
+    cache, held = SharedQuoteCache(backend, lock_ttl=30, clock=clock), []
+    def fetch(symbols):
+        clock.now += 100
+        held.append(backend.locked(cache._key("lock", "br")))
+        return {s: 1.0 for s in symbols}
+    cache.refresh("br", ["X"], fetch, 60, budget=280)
+    assert held == [True]
+    assert not backend.locked(cache._key("lock", "br"))
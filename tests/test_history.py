@@ -0,0 +1,11 @@
+import numpy as np
+
+from engine.history import HistoryStore
+
+def test_unexpected_npy_is_treated_as_empty(tmp_path, counter):
+    store = HistoryStore(str(tmp_path), fetch=None)
+    np.save(tmp_path / "BAD.SA.npy", np.arange(5.0))
+    assert store.bars("BAD.SA") is None and store.bars("NONE.SA") is None
+    assert counter("stage_failures_total", stage="history_read") == 1
+    frame = store.trends(["BAD.SA", "NONE.SA"])
+    assert frame['1M%'].isna().all() and frame['Tendência'].isna().all()
@@ -0,0 +1,38 @@
+import openpyxl
+
+from engine.ingest import ingest, read_sheet
+from engine.sheet import dedupe_columns
+
+def workbook(path, header, rows):
+    wb = openpyxl.Workbook()
+    wb.active.append(header)
+    for row in rows: wb.active.append(row)
+    wb.save(path)
+    return str(path)
+
+def test_dedupe_columns_like_pandas():
+    assert dedupe_columns(["DY", "DY", "A", "DY", "DY.1"]) == ["DY", "DY.1", "A", "DY.2", "DY.1.1"]
+
+def test_duplicated_header_keeps_first_column(tmp_path):
+    path = workbook(tmp_path / "dup.xlsx", ["TICKER", "BAZIN", "DY", "DY", "DPA"],
+                    [["BBAS3", "R$ 30,00", "9%", "1%", 2.5], ["ITSA4", 12, "8,5%", "2%", 0.9]])
+    assert list(read_sheet(path, "Sheet")) == ["TICKER", "BAZIN", "DY", "DY.1", "DPA"]
+    out = ingest(path).set_index('TICKER_F')
+    assert out.loc["BBAS3", "DY_F"] == 9.0 and out.loc["ITSA4", "DY_F"] == 8.5
+
+def test_bad_source_is_skipped(tmp_path, counter):
+    good = workbook(tmp_path / "good.xlsx", ["TICKER", "BAZIN", "DY"], [["BBAS3", 30, "9%"]])
+    bad = tmp_path / "bad.xlsx"
+    bad.write_bytes(b"not a zip")
+    out = ingest([good, str(bad)])
+    assert out['TICKER_F'].tolist() == ["BBAS3"]
+    assert counter("stage_failures_total", stage="ingest_scan") == 1
+
+def test_bad_sheet_is_skipped(tmp_path, counter):
+    # O cabeçalho passa na varredura, mas a leitura quebra numa linha com campos a mais
+    good = workbook(tmp_path / "good.xlsx", ["TICKER", "BAZIN"], [["BBAS3", 30]])
+    broken = tmp_path / "broken.csv"
+    broken.write_text("TICKER,BAZIN\nITSA4,12\nX,1,2,3\n")
+    out = ingest([good, str(broken)], workers=1)
+    assert out['TICKER_F'].tolist() == ["BBAS3"]
+    assert counter("stage_failures_total", stage="ingest_parse") == 1
@@ -0,0 +1,84 @@
+import base64
+import io
+import os
+
+import pandas as pd
+import pytest
+from PIL import Image
+
+from engine.logos import LogoCache
+from engine.sheet import get_logo_url
+
+class Clock:
+    def __init__(self, now=1000.0): self.now = now
+    def __call__(self): return self.now
+
+def png(color=(200, 30, 30), size=64):
+    out = io.BytesIO()
+    Image.new('RGB', (size, size), color).save(out, 'PNG')
+    return out.getvalue()
+
+class Fetch:
+    # Fake da rede por URL: bytes, None (404) ou exceção (falha transitória)
+    def __init__(self, responses): self.responses, self.calls = responses, []
+    def __call__(self, url):
+        self.calls.append(url)
+        out = self.responses[url]
+        if isinstance(out, Exception): raise out
+        return out
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+def test_seeded_logo_is_served_as_data_uri(tmp_path, clock):
+    cache = LogoCache(root=str(tmp_path), fetch=Fetch({}), clock=clock, size=16)
+    cache.seed("BBAS3", png())
+    uri = cache.data_uri("BBAS3")
+    assert uri.startswith("data:image/png;base64,")
+    with Image.open(io.BytesIO(base64.b64decode(uri.split(",", 1)[1]))) as img: assert img.size == (16, 16)
+    # Conteúdo endereçado: a mesma imagem para outro ticker não gera outro arquivo
+    cache.seed("BBSE3", png())
+    assert len([f for f in os.listdir(tmp_path) if f.endswith(".png")]) == 1
+    assert cache.prefetch(["BBAS3", "BBSE3"]) == 0
+
+def test_404_is_recorded_as_negative_until_ttl(tmp_path, clock):
+    fetch = Fetch({get_logo_url("XPTO3"): None})
+    cache = LogoCache(root=str(tmp_path), fetch=fetch, clock=clock, negative_ttl=100)
+    assert cache.prefetch(["XPTO3"]) == 1
+    assert cache.index["XPTO3"]['sha'] is None
+    clock.now += 99
+    assert cache.prefetch(["XPTO3"]) == 0
+    clock.now += 1
+    assert cache.prefetch(["XPTO3"]) == 1 and len(fetch.calls) == 2
+    # O negativo sobrevive a um restart (index.json)
+    assert LogoCache(root=str(tmp_path), fetch=fetch, clock=clock).index["XPTO3"]['sha'] is None
+
+def test_transient_failure_backs_off(tmp_path, clock):
+    url = get_logo_url("ITSA4")
+    fetch = Fetch({url: OSError("timed out")})
+    cache = LogoCache(root=str(tmp_path), fetch=fetch, clock=clock, retry_ttl=60)
+    for _ in range(3): cache.prefetch(["ITSA4"])
+    assert len(fetch.calls) == 1 and cache.index["ITSA4"]['failures'] == 1
+    clock.now += 60
+    cache.prefetch(["ITSA4"])
+    assert len(fetch.calls) == 2 and cache.index["ITSA4"]['failures'] == 2
+    clock.now += 60
+    cache.prefetch(["ITSA4"])
+    assert len(fetch.calls) == 2
+    clock.now += 60
+    fetch.responses[url] = png()
+    cache.prefetch(["ITSA4"])
+    assert len(fetch.calls) == 3 and cache.index["ITSA4"]['sha'] is not None
+
+def test_resolve(tmp_path, clock):
+    fetch = Fetch({get_logo_url("NONE3"): None, get_logo_url("DOWN3"): OSError("503")})
+    cache = LogoCache(root=str(tmp_path), fetch=fetch, clock=clock)
+    cache.seed("BBAS3", png())
+    cache.prefetch(["NONE3", "DOWN3"])
+    tickers = pd.Series(["BBAS3", "NONE3", "DOWN3", "NEW3"])
+    remote = tickers.map(get_logo_url)
+    out = cache.resolve(tickers, remote).tolist()
+    assert out[0] == cache.data_uri("BBAS3")
+    # 404 fica sem logo; falha transitória e ticker ainda não buscado ficam com a URL remota
+    assert out[1:] == ["", remote[2], remote[3]]
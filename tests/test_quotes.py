@@ -0,0 +1,136 @@
+import threading
+import time
+
+from engine.fakes import FakeDownloader
+from engine.history import HistoryStore, fetch_daily_closes
+from engine.quotes import (MARKET_TICKERS, MarketRefresher, PriceStream, fetch_br_prices, fetch_price_chunk,
+                           get_br_prices_stored, serialize)
+
+TICKERS = [f"T{i:03d}" for i in range(400)]
+
+class Clock:
+    def __init__(self, now): self.now = now
+    def __call__(self): return self.now
+
+def test_failed_chunk_loses_only_its_tickers(counter):
+    down = FakeDownloader(fail={"T000.SA"})
+    prices, metrics = fetch_br_prices(TICKERS[:150], downloader=down, chunk_size=50, retries=1)
+    assert set(prices) == set(TICKERS[50:150])
+    bad = [m for m in metrics if m['error'] is not None]
+    assert [m['chunk'] for m in bad] == [0]
+    assert bad[0]['attempts'] == 2 and bad[0]['missing'] == 50
+    assert counter("fetch_retries_total", source="br") == 1
+    assert counter("fetch_errors_total", source="br") == 50
+
+def test_nan_columns_are_retried(counter):
+    # O yfinance devolve NaN para o símbolo que falhou; a segunda tentativa pede só ele
+    inner, asked = FakeDownloader(missing={"T001.SA"}), []
+    def flaky(tickers, **kwargs):
+        asked.append(list(tickers))
+        if len(asked) > 1: inner.missing.clear()
+        return inner(tickers, **kwargs)
+    prices, metric = fetch_price_chunk(TICKERS[:5], downloader=flaky, retries=2)
+    assert set(prices) == set(TICKERS[:5])
+    assert asked == [[f"{t}.SA" for t in TICKERS[:5]], ["T001.SA"]]
+    assert metric['attempts'] == 2 and metric['error'] is None and metric['missing'] == 0
+    assert counter("fetch_retries_total", source="br") == 1
+
+def test_missing_symbol_counts_as_error_after_retries(counter):
+    prices, metric = fetch_price_chunk(TICKERS[:3], downloader=FakeDownloader(missing={"T002.SA"}), retries=1)
+    assert set(prices) == set(TICKERS[:2])
+    assert metric['attempts'] == 2 and metric['missing'] == 1
+    assert counter("fetch_errors_total", source="br", symbol="T002") == 1
+
+def test_serialized_chunks_share_the_deadline(counter):
+    # 8 lotes em fila atrás de um lock, cada um mais lento que o orçamento de um lote só:
+    # o prazo precisa contar a fila, senão os últimos lotes estouram e perdem os preços
+    down = FakeDownloader(latency=0.05)
+    prices, metrics = fetch_br_prices(TICKERS, downloader=serialize(down), chunk_size=50, retries=0, timeout=0.03, slack=0.05)
+    assert len(prices) == len(TICKERS)
+    assert all(m['error'] is None for m in metrics)
+    assert down.calls == 8
+    assert counter("fetch_timeouts_total", source="br") == 0
+
+def test_hung_chunk_times_out_alone(counter):
+    down = FakeDownloader()
+    def hanging(tickers, **kwargs):
+        if "T000.SA" in tickers: time.sleep(1.0)
+        return down(tickers, **kwargs)
+    start = time.perf_counter()
+    prices, metrics = fetch_br_prices(TICKERS[:200], downloader=hanging, chunk_size=50, retries=0, timeout=0.05, slack=0.1)
+    assert time.perf_counter() - start < 0.9
+    assert set(prices) == set(TICKERS[50:200])
+    timed_out = [m for m in metrics if m['attempts'] == 0]
+    assert [m['chunk'] for m in timed_out] == [0] and 'TimeoutError' in timed_out[0]['error']
+    assert counter("fetch_timeouts_total", source="br") == 1
+
+def test_stream_groups_by_each_tickers_last_bar():
+    now = 1_800_000_000.0
+    stream = PriceStream(fetch_bars=None, bucket=300, idle_after=3600, clock=lambda: now)
+    stream._tickers.update(["A", "B", "C", "D", "E"])
+    stream.apply({"A": (1.0, now - 60), "B": (2.0, now - 90), "C": (3.0, now - 1200), "D": (4.0, now - 7200)})
+    groups = {tuple(g): since for g, since in stream._groups()}
+    # Só E (nunca visto) pede o dia; cada um dos outros parte da própria janela
+    assert groups == {("E",): None, ("D",): (now - 7200) // 300 * 300,
+                      ("C",): (now - 1200) // 300 * 300, ("A", "B"): (now - 90) // 300 * 300}
+
+def test_stream_backs_off_idle_tickers():
+    # Depois do fechamento: 200 tickers com a última barra há 2h, mais um que nunca trouxe barra
+    clock = Clock(1_800_000_000.0)
+    calls = []
+    def fetch_bars(chunk, since):
+        calls.append((len(chunk), since))
+        return {}
+    stream = PriceStream(fetch_bars=fetch_bars, idle_after=3600, idle_interval=600, clock=clock)
+    stream._tickers.update(TICKERS[:200] + ["NEW"])
+    stream.apply({t: (10.0, clock.now - 7200) for t in TICKERS[:200]})
+    stream.poll()
+    assert sorted(calls, key=str) == sorted([(1, None)] + [(50, (clock.now - 7200) // 300 * 300)] * 4, key=str)
+    for _ in range(19):
+        clock.now += 30
+        stream.poll()
+    assert len(calls) == 5
+    clock.now += 30
+    stream.poll()
+    assert len(calls) == 10 and all(since is not None for n, since in calls if n == 50)
+
+def test_stream_ignores_older_bars():
+    stream = PriceStream(fetch_bars=None)
+    assert stream.apply({"A": (10.0, 100.0)}) == ["A"]
+    version = stream.version
+    assert stream.apply({"A": (9.0, 50.0)}) == []
+    assert stream.version == version and stream.prices["A"] == (10.0, 100.0)
+    assert stream.apply({"A": (10.0, 160.0)}) == []
+    assert stream.apply({"A": (11.0, 220.0)}) == ["A"]
+    assert stream.deltas_since(version) == (version + 1, {"A": 11.0})
+
+def test_failed_store_io_is_counted(counter):
+    class BrokenStore:
+        def load(self, symbols): raise OSError("database is locked")
+        def upsert(self, quotes, ts=None): raise OSError("disk full")
+    fetch = lambda tickers: ({t: 10.0 for t in tickers}, [])
+    prices, _ = get_br_prices_stored(["A", "B"], BrokenStore(), fetch=fetch)
+    assert prices == {"A": 10.0, "B": 10.0}
+    assert counter("stage_failures_total", stage="quote_store_read", source="br") == 1
+    assert counter("stage_failures_total", stage="quote_store_write", source="br") == 1
+
+def test_refresher_publishes_quotes_before_the_history_backfill(tmp_path, counter):
+    backfill = threading.Event()
+    def slow_closes(symbols, start_day):
+        backfill.wait(5)
+        return fetch_daily_closes(symbols, start_day, FakeDownloader(bars=40))
+    history = HistoryStore(str(tmp_path), fetch=slow_closes)
+    refresher = MarketRefresher(fetch=lambda: {t: (10.0, 9.0) for t in MARKET_TICKERS}, history=history)
+    start = time.perf_counter()
+    refresher.refresh()
+    assert time.perf_counter() - start < 1
+    version, frames = refresher.versioned(timeout=0)
+    assert version == 1 and frames['USA']['Preço'].tolist() == [10.0] * 4
+    assert frames['USA']['1M%'].isna().all()
+    backfill.set()
+    for _ in range(100):
+        if refresher.version > 1: break
+        time.sleep(0.05)
+    version, frames = refresher.versioned(timeout=0)
+    assert version == 2 and frames['USA']['1M%'].notna().all()
+    assert frames['USA']['Preço'].tolist() == [10.0] * 4
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine.scenarios import ScenarioGrid, apply_scenario, scenario_inputs
+from engine.sheet import apply_prices, margin_values
+
+def static_frame(rows=60, seed=0):
+    rng = np.random.default_rng(seed)
+    tickers = [f"T{i:03d}" for i in range(rows)]
+    dpa = rng.uniform(0, 8, rows)
+    dpa[:3] = 0.0
+    # Teto da planilha independente do DPA, para o cenário reordenar as linhas de verdade
+    return pd.DataFrame({'Logo': "", 'Ativo': tickers, 'TICKER_F': tickers, 'BAZIN_F': rng.uniform(1, 120, rows), 'DPA_F': dpa,
+                         'DY_F': rng.uniform(0, 15, rows)})
+
+def radar_frame(static, seed=1):
+    rng = np.random.default_rng(seed)
+    # Alguns ativos sem cotação (preço 0 -> margem -999)
+    prices = {t: float(p) for t, p in zip(static['TICKER_F'], rng.uniform(5, 100, len(static))) if not t.endswith("7")}
+    return apply_prices(static, prices)
+
+def recompute(dpa, preco, target_yield, shock):
+    # O cálculo de antes: um margin_values por cenário
+    return margin_values(pd.Series(dpa / (target_yield / 100)), pd.Series(preco * (1 + shock / 100))).to_numpy()
+
+@pytest.fixture
+def data():
+    static = static_frame()
+    radar = radar_frame(static)
+    dpa, preco = scenario_inputs(radar, static)
+    return radar, ScenarioGrid(dpa, preco), dpa, preco
+
+# Pontos da grade e, por último, dois cenários fora dela (calculados sob demanda)
+@pytest.mark.parametrize("target_yield, shock", [(6.0, 0), (4.0, -30), (12.0, 30), (7.3, -12), (6, 2.5)])
+def test_grid_matches_per_scenario_recompute(data, target_yield, shock):
+    _, grid, dpa, preco = data
+    expected = recompute(dpa, preco, target_yield, shock)
+    np.testing.assert_allclose(grid.margin(target_yield, shock), expected)
+    assert grid.count(target_yield, shock) == int((expected > grid.threshold).sum())
+    # Fora da grade, a segunda consulta sai do cache com o mesmo resultado
+    assert grid.count(target_yield, shock) == int((expected > grid.threshold).sum())
+
+def test_apply_scenario_keeps_margins_on_their_rows(data):
+    radar, grid, _, _ = data
+    dpa = radar['TICKER_F'].map(static_frame().set_index('TICKER_F')['DPA_F'])
+    for target_yield, shock in [(6.0, 0), (9.5, -20), (7.3, 12)]:
+        out = apply_scenario(radar, grid, target_yield, shock)
+        assert not out.index.equals(radar.index)
+        assert out['MARGEM_VAL'].is_monotonic_decreasing
+        assert sorted(out['TICKER_F']) == sorted(radar['TICKER_F'])
+        # Cada linha, depois de reordenada, carrega o teto, o preço chocado e a margem do próprio ticker
+        np.testing.assert_allclose(out['BAZIN_F'], dpa[out.index] / (target_yield / 100))
+        np.testing.assert_allclose(out['PRECO_F'], radar.loc[out.index, 'PRECO_F'] * (1 + shock / 100))
+        np.testing.assert_allclose(out['MARGEM_VAL'], margin_values(out['BAZIN_F'], out['PRECO_F']))
+        assert (out.loc[out['PRECO_F'] == 0, 'MARGEM_VAL'] == -999).all()
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from engine.fakes import synthetic_sheet
+from engine.search import SearchIndex, fold_text, search_rows
+
+NAMES = ["Ações Itaú", "Banco do Brasil", "BB Seguridade", "Cia Energética de Minas Gerais", "Sanepar",
+         "Vale", "Petróleo Brasileiro", "Itaúsa", "Klabin", "Odontoprev", "Caixa Seguridade", "São Martinho", ""]
+TICKERS = ["ITUB4", "BBAS3", "BBSE3", "CMIG4", "SAPR4", "VALE3", "PETR4", "ITSA4", "KLBN4", "ODPV3", "CXSE3", "SMTO3", "X1"]
+
+def frame():
+    df = pd.DataFrame({'Ativo': NAMES, 'TICKER_F': TICKERS}, index=range(100, 100 + len(NAMES)))
+    extra = synthetic_sheet(300, seed=3).rename(columns={'TICKER': 'TICKER_F', 'EMPRESA': 'Ativo'})
+    extra.index = range(1000, 1000 + len(extra))
+    return pd.concat([df, extra[['Ativo', 'TICKER_F']]])
+
+def old_filter(df, query):
+    # O filtro anterior (str.contains, sem regex), sobre o texto já sem acentos dos dois lados
+    q = fold_text(query)
+    names, tickers = df['Ativo'].map(fold_text), df['TICKER_F'].map(fold_text)
+    return df[names.str.contains(q, regex=False) | tickers.str.contains(q, regex=False)]
+
+@pytest.fixture(scope="module")
+def data():
+    df = frame()
+    return df, SearchIndex(df.index, df['Ativo'], df['TICKER_F'])
+
+@pytest.mark.parametrize("query", [
+    "a", "I", "ç", "é", "bb", "ba", "3", "4", "ita", "itá", "SEG",
+    "seguridade", "Itaú", "acoes", "banco do", "energetica de", "bbas3", "petr4", "são m", "zzzz", "co d",
+])
+def test_search_rows_matches_old_filter(data, query):
+    df, index = data
+    pd.testing.assert_frame_equal(search_rows(df, index, query), old_filter(df, query))
+
+def test_query_does_not_match_across_name_and_ticker(data):
+    df, index = data
+    # Sem o \0, "vale" + "vale3" formariam "valevale3" e "valev", "ev", "lev" bateriam
+    assert search_rows(df, index, "valev").empty
+    assert search_rows(df, index, "ev").equals(old_filter(df, "ev"))
+    assert "VALE3" not in search_rows(df, index, "lev")['TICKER_F'].tolist()
+    assert "SMTO3" not in search_rows(df, index, "hosm")['TICKER_F'].tolist()
+
+def test_empty_query_returns_everything(data):
+    df, index = data
+    assert search_rows(df, index, "") is df
+    assert search_rows(df, None, "itau") is df
+    assert len(index.search("")) == len(df)
@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine.sheet as sheet
+from engine.sheet import (SheetCache, clean_currency, clean_currency_series, clean_dy_percentage, clean_dy_series,
+                          margin_values, parse_spreadsheet)
+
+MESSY = [
+    "R$ 1.234,56", "R$37,24", "  12 ", "7,5%", "0,07", "1.000", "", "abc", "nan", "1_000", "R$ -3,50",
+    12, 0, -4, 3.5, 0.07, np.float64(0.5), np.int64(9), True, None, np.nan, float('nan'), pd.Timestamp("2026-01-01"),
+]
+
+def same(a, b):
+    return np.array_equal(np.asarray(a, dtype=float), np.asarray(b, dtype=float), equal_nan=True)
+
+@pytest.mark.parametrize("values", [
+    MESSY,
+    ["R$ 1.234,56", "R$ 2,00", "3%"],
+    [1, 2.5, np.nan],
+    [None, None],
+    [],
+])
+def test_clean_currency_series_matches_scalar(values):
+    s = pd.Series(values, dtype=object)
+    assert same(clean_currency_series(s), s.apply(clean_currency))
+
+def test_clean_dy_series_matches_scalar():
+    s = pd.Series(MESSY, dtype=object)
+    assert same(clean_dy_series(s), s.apply(clean_dy_percentage))
+
+def test_numeric_dtypes_pass_through():
+    for s in (pd.Series([1, 2, 3]), pd.Series([0.07, np.nan, 12.0])):
+        assert same(clean_currency_series(s), s.apply(clean_currency))
+        assert same(clean_dy_series(s), s.apply(clean_dy_percentage))
+
+def test_index_is_kept():
+    s = pd.Series(["R$ 1,00", 2], index=[10, 20], dtype=object)
+    assert list(clean_currency_series(s).index) == [10, 20]
+    assert list(clean_dy_series(s).index) == [10, 20]
+
+def test_margin_values_matches_rowwise():
+    frame = pd.DataFrame({'BAZIN_F': [10.0, 10.0, 0.0, 50.0, 8.0, 3.0],
+                          'PRECO_F': [8.0, 12.5, 5.0, 0.0, -1.0, np.nan]})
+    old = frame.apply(lambda x: ((x['BAZIN_F'] - x['PRECO_F']) / x['PRECO_F'] * 100) if x['PRECO_F'] > 0 else -999, axis=1)
+    new = margin_values(frame['BAZIN_F'], frame['PRECO_F'])
+    assert same(new, old)
+    assert new.iloc[3] == -999 and new.iloc[4] == -999 and new.iloc[5] == -999
+
+def sheet_cache(tmp_path):
+    path = tmp_path / "fund.csv"
+    path.write_text("TICKER,BAZIN,DY\nBBAS3,\"R$ 30,00\",9%\n")
+    parsed = []
+    def parse(p):
+        parsed.append(p)
+        return parse_spreadsheet(p)
+    return str(path), parsed, lambda: SheetCache(parse=parse, cache_dir=str(tmp_path / "cache"))
+
+def sidecars(tmp_path):
+    return sorted(os.listdir(tmp_path / "cache"))
+
+def test_sheet_cache_hits_until_the_file_changes(tmp_path):
+    path, parsed, make = sheet_cache(tmp_path)
+    cache = make()
+    first = cache.get(path)
+    assert cache.get(path) is first
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'sidecar_hits': 0} and len(parsed) == 1
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    cache.get(path)
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'sidecar_hits': 0} and len(parsed) == 2
+
+def test_sheet_cache_sidecar_survives_a_restart(tmp_path):
+    path, parsed, make = sheet_cache(tmp_path)
+    expected = make().get(path)
+    cache = make()
+    pd.testing.assert_frame_equal(cache.get(path), expected)
+    assert cache.stats() == {'hits': 0, 'misses': 1, 'sidecar_hits': 1} and len(parsed) == 1
+
+def test_stale_sidecar_is_removed(tmp_path):
+    path, _, make = sheet_cache(tmp_path)
+    make().get(path)
+    before = sidecars(tmp_path)
+    with open(path, "a") as f: f.write("ITSA4,12,8%\n")
+    assert make().get(path)['TICKER_F'].tolist() == ["BBAS3", "ITSA4"]
+    after = sidecars(tmp_path)
+    assert len(before) == len(after) == 1 and before != after
+
+def test_schema_change_invalidates_the_sidecar(tmp_path, monkeypatch):
+    path, parsed, make = sheet_cache(tmp_path)
+    make().get(path)
+    monkeypatch.setattr(sheet, "SHEET_SCHEMA", sheet.SHEET_SCHEMA + 1)
+    cache = make()
+    cache.get(path)
+    assert cache.stats()['sidecar_hits'] == 0 and len(parsed) == 2
+    assert len(sidecars(tmp_path)) == 1